@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+
+#
+# Benchmarks for secp256r1.py
+#
+#       python benchmark.py                             run everything
+#       python benchmark.py -k verify                   only matching names
+#       python benchmark.py -o result.json              save the results
+#       python benchmark.py --compare baseline.json     flag regressions
+#
+# Every benchmark runs on fixed inputs derived from a constant seed, so
+# results from different runs and machines measure the same work.  A
+# result records ops/sec (from the median sample) and the 50th, 90th and
+# 99th percentile of the per-operation time in microseconds.
+#
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+import secp256r1
+
+SEED = 20240101
+
+CERTIFICATE = bytes.fromhex('3082013c3081e4a003020102020a47901280001155957352300a06082a8648ce3d0403023017311530130603550403130c476e756262792050696c6f74301e170d3132303831343138323933325a170d3133303831343138323933325a3031312f302d0603550403132650696c6f74476e756262792d302e342e312d34373930313238303030313135353935373335323059301306072a8648ce3d020106082a8648ce3d030107034200048d617e65c9508e64bcc5673ac82a6799da3c1446682c258c463fffdf58dfd2fa3e6c378b53d795c4a4dffb4199edd7862f23abaf0203b4b8911ba0569994e101300a06082a8648ce3d0403020347003044022060cdb6061e9c22262d1aac1d96d8c70829b2366531dda268832cb836bcd30dfa0220631b1459f09e6330055722c8d89b7f48883b9089b88d60d1d9795902b30410df')
+
+def make_keypair(rng):
+    d = rng.randrange(1, secp256r1.q)
+    Q = secp256r1.e_mul(secp256r1.e(1), secp256r1.fq(d))
+    return d, secp256r1.e_to_octetstring(Q)
+
+def sign(rng, d, message):
+    # textbook ECDSA with a k from rng; only good for making test vectors,
+    # which the tests also make with it
+    q = secp256r1.q
+    h = secp256r1._ecdsa_signature_base_octetstring_to_integer_mod_q_(message)
+    while True:
+        k = rng.randrange(1, q)
+        r = secp256r1.e_to_integer(
+                secp256r1.e_mul(secp256r1.e(1), secp256r1.fq(k))) % q
+        s = pow(k, q - 2, q) * (h + r * d) % q
+        if r != 0 and s != 0:
+            return der_signature(r, s)
+
+def der_signature(r, s):
+    def der_integer(i):
+        octets = i.to_bytes(length=i.bit_length() // 8 + 1, byteorder='big')
+        return b'\x02' + bytes([len(octets)]) + octets
+    body = der_integer(r) + der_integer(s)
+    return b'\x30' + bytes([len(body)]) + body
+
+def make_inputs():
+    rng = random.Random(SEED)
+    keys = [make_keypair(rng) for _ in range(16)]
+    items = []
+    for i in range(256):
+        d, publickey = keys[i % len(keys)]
+        message = b'benchmark message %d' % i
+        items.append((publickey, message, sign(rng, d, message)))
+    return {
+        'fp_a':         secp256r1.fp(rng.randrange(1, secp256r1.p)),
+        'fp_b':         secp256r1.fp(rng.randrange(1, secp256r1.p)),
+        'fp_square':    secp256r1.fp_square(
+                            secp256r1.fp(rng.randrange(1, secp256r1.p))),
+        'point_a':      secp256r1.e_mul(
+                            secp256r1.e(1),
+                            secp256r1.fq(rng.randrange(1, secp256r1.q))),
+        'point_b':      secp256r1.e_mul(
+                            secp256r1.e(1),
+                            secp256r1.fq(rng.randrange(1, secp256r1.q))),
+        'scalar':       secp256r1.fq(rng.randrange(1, secp256r1.q)),
+        'compressed':   secp256r1.ecdsa_compress_publickey(keys[0][1]),
+        'items':        items,
+    }
+
+def benchmarks(inputs, workers, resources):
+    """
+    resources is a contextlib.ExitStack; pools and schedulers are created
+    on the first (untimed, warm-up) call and closed when it is closed
+    """
+    S = secp256r1
+    fp_a, fp_b = inputs['fp_a'], inputs['fp_b']
+    point_a, point_b = inputs['point_a'], inputs['point_b']
+    scalar = inputs['scalar']
+    items = inputs['items']
+    publickey, message, signature = items[0]
+    def verify_all():
+        for item in items:
+            S.ecdsa_verify_signature(*item)
+    shared = {}
+    def scheduled():
+        if 'scheduler' not in shared:
+            shared['scheduler'] = resources.enter_context(
+                    S.ecdsa_VerificationScheduler())
+        scheduler = shared['scheduler']
+        for future in [scheduler.submit(*item) for item in items]:
+            future.result()
+    def parallel():
+        if 'pool' not in shared:
+            # several chunks per worker, or everything runs in one process
+            shared['pool'] = resources.enter_context(S.ecdsa_VerifierPool(
+                    workers=workers,
+                    chunksize=max(len(items) // (4 * workers), 1)))
+        shared['pool'].verify(items)
+    #
+    # (name, function, operations per call)
+    #
+    return (
+        ('micro.fp_mul',            lambda: S.fp_mul(fp_a, fp_b),           1),
+        ('micro.fp_inv',            lambda: S.fp_inv(fp_a),                 1),
+        ('micro.fp_sqrt',           lambda: S.fp_sqrt(inputs['fp_square']), 1),
+        ('micro.e_dbl',             lambda: S.e_dbl(point_a),               1),
+        ('micro.e_add',             lambda: S.e_add(point_a, point_b),      1),
+        ('micro.e_mul',             lambda: S.e_mul(point_a, scalar),       1),
+        ('micro.e_mul_generator',   lambda: S.e_mul(S.e(1), scalar),        1),
+        ('micro.decompress_publickey',
+            lambda: S.ecdsa_decompress_publickey(inputs['compressed']),     1),
+        ('macro.decompress_bulk',
+            lambda: S.ecdsa_decompress_publickeys(
+                        inputs['compressed'] * 64),                        64),
+        ('micro.asn1_parse_signature',
+            lambda: S._asn1_parse_a_sequence_of_two_signed_integers_(
+                        signature),                                         1),
+        ('micro.extract_publickey_from_certificate',
+            lambda: S.ecdsa_extract_publickey_octetstring_from_certificate(
+                        CERTIFICATE),                                       1),
+        ('macro.verify_single',
+            lambda: S.ecdsa_verify_signature(publickey, message,
+                                             signature),                    1),
+        ('macro.verify_sequential', verify_all,                    len(items)),
+        ('macro.verify_batch',
+            lambda: S.ecdsa_verify_signatures_batch(items),        len(items)),
+        ('macro.verify_scheduled',  scheduled,                     len(items)),
+        ('macro.verify_parallel',   parallel,                      len(items)),
+    )
+
+def measure(function, operations, samples, min_sample_time):
+    function()
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_sample_time:
+            break
+        number *= 2
+    times = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / (number * operations))
+    times.sort()
+    return {
+        'ops_per_sec': 1 / percentile(times, 50),
+        'p50_us':      percentile(times, 50) * 1e6,
+        'p90_us':      percentile(times, 90) * 1e6,
+        'p99_us':      percentile(times, 99) * 1e6,
+        'samples':     samples,
+        'number':      number,
+    }
+
+def percentile(sorted_values, pct):
+    index = (len(sorted_values) - 1) * pct / 100
+    lower = int(index)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    fraction = index - lower
+    return (sorted_values[lower] * (1 - fraction) +
+            sorted_values[upper] * fraction)
+
+def compare(results, baseline, threshold):
+    """
+    return the names whose ops/sec dropped by more than threshold
+    """
+    regressions = []
+    for name, result in sorted(results.items()):
+        if name not in baseline:
+            continue
+        before = baseline[name]['ops_per_sec']
+        after = result['ops_per_sec']
+        change = after / before - 1
+        flag = ''
+        if change < -threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('{:45} {:>12.1f} -> {:>12.1f} ops/s {:>+7.1%}{}'.format(
+                name, before, after, change, flag))
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='benchmark secp256r1.py')
+    parser.add_argument('-k', '--filter', default='',
+                        help='only run benchmarks whose name contains this')
+    parser.add_argument('-o', '--output',
+                        help='write the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE',
+                        help='compare with results stored in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.10,
+                        help='relative slowdown reported as a regression')
+    parser.add_argument('--samples', type=int, default=15)
+    parser.add_argument('--min-sample-time', type=float, default=0.05)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args(argv)
+
+    inputs = make_inputs()
+    results = {}
+    with contextlib.ExitStack() as resources:
+        for name, function, operations in benchmarks(inputs, args.workers,
+                                                     resources):
+            if args.filter not in name:
+                continue
+            results[name] = measure(function, operations, args.samples,
+                                    args.min_sample_time)
+            print('{:45} {:>12.1f} ops/s   p50 {:>10.1f} us   p99 {:>10.1f} us'
+                  .format(name, results[name]['ops_per_sec'],
+                          results[name]['p50_us'], results[name]['p99_us']))
+
+    if args.output:
+        document = {
+            'python':   platform.python_version(),
+            'machine':  platform.machine(),
+            'seed':     SEED,
+            'backend':  secp256r1.get_field_backend(),
+            'results':  results,
+        }
+        with open(args.output, 'w') as stream:
+            json.dump(document, stream, indent=2, sort_keys=True)
+
+    if args.compare:
+        with open(args.compare) as stream:
+            baseline = json.load(stream)
+        backend = baseline.get('backend')
+        regressions = compare(results, baseline['results'], args.threshold)
+        if backend != secp256r1.get_field_backend():
+            # a different field backend changes every number; report the
+            # differences but do not fail on them
+            print('baseline used the {} field backend, this run {}; '
+                  'not failing on regressions'.format(
+                          backend, secp256r1.get_field_backend()))
+        elif regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
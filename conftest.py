@@ -0,0 +1,153 @@
+#
+# Fixtures shared by the test modules
+#
+# Keys and signatures are made with make_keypair and sign from
+# benchmark.py, which owns them; the tests import them from there.
+#
+
+import random
+
+import pytest
+
+import secp256r1
+from secp256r1 import q
+
+from benchmark import der_signature, make_keypair, sign
+
+@pytest.fixture(scope='session')
+def keys():
+    rng = random.Random(5)
+    return [make_keypair(rng) for _ in range(6)]
+
+@pytest.fixture(scope='session')
+def items(keys):
+    # valid (publickey, message, signature) triples
+    rng = random.Random(6)
+    items = []
+    for i in range(40):
+        d, publickey = keys[i % len(keys)]
+        message = b'message %d' % i
+        items.append((publickey, message, sign(rng, d, message)))
+    return items
+
+@pytest.fixture(scope='session')
+def high_x_item():
+    # a valid (publickey, message, signature) whose R has x(R) >= q, so
+    # r = x(R) - q and r + q < p: the key is recovered from R as
+    # Q = r^( -1 ) * (s * R - h * G)
+    G = secp256r1.e(1)
+    message = b'x(R) >= q'
+    x = q
+    while True:
+        x += 1
+        try:
+            R = secp256r1.e_from_octetstring(
+                    b'\x02' + x.to_bytes(length=32, byteorder='big'))
+            break
+        except secp256r1.e_Error:
+            pass
+    r = x - q
+    s = random.Random(7).randrange(1, q)
+    h = secp256r1._ecdsa_signature_base_octetstring_to_integer_mod_q_(message)
+    sR = secp256r1.e_mul(R, secp256r1.fq(s))
+    hG = secp256r1.e_mul(G, secp256r1.fq(h))
+    Q = secp256r1.e_mul(secp256r1.e_add(sR, secp256r1.e_neg(hG)),
+                        secp256r1.fq(pow(r, q - 2, q)))
+    return secp256r1.e_to_octetstring(Q), message, der_signature(r, s)
+
+@pytest.fixture(scope='session')
+def mixed_items(keys, items, high_x_item):
+    # (item, whether ecdsa_verify_signature accepts it)
+    (_, key0), (_, key1) = keys[:2]
+    publickey, message, signature = items[0]
+    r, s = secp256r1._asn1_parse_a_sequence_of_two_signed_integers_(signature)
+    high_key, high_message, high_signature = high_x_item
+    return [
+        (items[0],                                              True),
+        ((publickey, message + b'!', signature),                False),
+        ((key1, message, signature),                            False),
+        ((publickey, message, der_signature(r, q - s)),         True),
+        ((publickey, message, der_signature(r, s + 1)),         False),
+        ((publickey, message, der_signature(r, 0)),             False),
+        ((publickey, message, der_signature(q, s)),             False),
+        ((publickey, message, b'\x30\x00'),                     False),
+        ((publickey, message, signature[:-1]),                  False),
+        ((b'\x04' + bytes(64), message, signature),             False),
+        ((publickey[:-1], message, signature),                  False),
+        ((secp256r1.ecdsa_compress_publickey(publickey),
+          message, signature),                                  True),
+        (high_x_item,                                           True),
+        ((high_key, high_message + b'!', high_signature),       False),
+        ((key0, high_message, high_signature),                  False),
+    ]
+
+ECDSA_WITH_SHA256 = bytes.fromhex('300a06082a8648ce3d040302')
+ECDSA_WITH_SHA384 = bytes.fromhex('300a06082a8648ce3d040303')
+SPKI_ALGORITHM = bytes.fromhex(
+        '301306072a8648ce3d020106082a8648ce3d030107')
+VALIDITY = bytes.fromhex('301e170d3132303831343138323933325a'
+                         '170d3133303831343138323933325a')
+
+def tlv(tag, value):
+    n = len(value)
+    if n < 0x80:
+        length = bytes([n])
+    elif n < 0x100:
+        length = b'\x81' + bytes([n])
+    else:
+        length = b'\x82' + n.to_bytes(length=2, byteorder='big')
+    return bytes([tag]) + length + value
+
+def name(common_name):
+    attribute = bytes.fromhex('0603550403') + tlv(0x13, common_name)
+    return tlv(0x30, tlv(0x31, tlv(0x30, attribute)))
+
+def subjectpublickeyinfo(publickey):
+    return tlv(0x30, SPKI_ALGORITHM + tlv(0x03, b'\x00' + publickey))
+
+def certificate(subject, publickey, issuer, issuer_d, rng,
+                version=True, algorithm=ECDSA_WITH_SHA256):
+    tbs = tlv(0x30, (bytes.fromhex('a003020102') if version else b'') +
+                    tlv(0x02, b'\x01') + algorithm + name(issuer) + VALIDITY +
+                    name(subject) + subjectpublickeyinfo(publickey))
+    signature = sign(rng, issuer_d, tbs)
+    return tlv(0x30, tbs + algorithm + tlv(0x03, b'\x00' + signature))
+
+@pytest.fixture(scope='session')
+def pki():
+    # DER certificates of a root -> intermediate -> leaf hierarchy, with
+    # broken variants, the root key and the SPKI encoding of every key
+    rng = random.Random(11)
+    root_d, root_key = make_keypair(rng)
+    inter_d, inter_key = make_keypair(rng)
+    leaf_d, leaf_key = make_keypair(rng)
+    other_d, other_key = make_keypair(rng)
+    pki = {
+        'root_key':  root_key,
+        'spki':      {label: subjectpublickeyinfo(key) for label, key in
+                      (('root', root_key), ('inter', inter_key),
+                       ('leaf', leaf_key), ('other', other_key))},
+        'root':      certificate(b'root', root_key, b'root', root_d, rng),
+        'inter':     certificate(b'inter', inter_key, b'root', root_d, rng),
+        'leaf':      certificate(b'leaf', leaf_key, b'inter', inter_d, rng),
+        # a self-signed root with the same name and a key nobody trusts
+        'fake_root': certificate(b'root', other_key, b'root', other_d, rng),
+        'v1_leaf':   certificate(b'leaf', leaf_key, b'inter', inter_d, rng,
+                                 version=False),
+        'misnamed':  certificate(b'leaf', leaf_key, b'other', inter_d, rng),
+        'wrong_key': certificate(b'inter', inter_key, b'root', other_d, rng),
+        'sha384':    certificate(b'leaf', leaf_key, b'inter', inter_d, rng,
+                                 algorithm=ECDSA_WITH_SHA384),
+    }
+    return pki
+
+@pytest.fixture(scope='session')
+def single():
+    # ecdsa_verify_signature with unparsable input counted as invalid
+    def single(publickey, message, signature):
+        try:
+            return secp256r1.ecdsa_verify_signature(publickey, message,
+                                                    signature)
+        except secp256r1.ecdsa_Error:
+            return False
+    return single
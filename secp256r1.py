@@ -1,3 +1,33 @@
+import argparse
+import asyncio
+import binascii
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import itertools
+import json
+import math
+import mmap
+import os
+import secrets
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from multiprocessing import shared_memory
+
+
+
+
+
+
+
+
+
+
 p  = 0xffffffff00000001000000000000000000000000ffffffffffffffffffffffff
 a  = 0xffffffff00000001000000000000000000000000fffffffffffffffffffffffc
 b  = 0x5ac635d8aa3a93e7b3ebbd55769886bc651d06b0cc53b0f63bce3c3e27d2604b
@@ -14,6 +44,147 @@ q  = 0xffffffff00000000ffffffffffffffffbce6faada7179e84f3b9cac2fc632551
 
 
 
+#
+# Untrusted input is validated once, when it is decoded (points in
+# e_from_octetstring, integers in the ASN.1 layer).  After that e_mul,
+# e_mul2 and signature verification run on plain integers without tagged
+# tuples or per-operation checks.  The reference mode routes them through
+# the original checked affine code instead, which is slow but easy to
+# audit; it is meant for debugging and differential testing.
+#
+
+_reference_mode_ = False
+
+def set_reference_mode(enabled):
+    global _reference_mode_
+    assert type(enabled) is bool
+    _reference_mode_ = enabled
+
+def get_reference_mode():
+    return _reference_mode_
+
+
+
+
+
+
+
+
+
+
+#
+# Field arithmetic backends
+#
+# Modular inversion and exponentiation, and the integer type used by the
+# Jacobian point arithmetic, come from a backend:
+#
+#       python      builtin int; inversion by pow(n, -1, m)
+#       gmpy2       gmpy2.mpz with gmpy2.invert and gmpy2.powmod; chosen
+#                   at import when gmpy2 is installed
+#       montgomery  builtin int; exponentiation by Montgomery
+#                   multiplication with R = 2^256 and inversion by
+#                   n^(m - 2), using only multiplications, masks and
+#                   shifts; slower than python on CPython, it is an
+#                   independent implementation that test_field_backends.py
+#                   checks the others against, and a model for ports
+#
+# The environment variable SECP256R1_FIELD_BACKEND overrides the choice
+# made at import.  The tagged Fp and Fq values always hold builtin ints;
+# backend integers only live inside the point arithmetic.
+#
+
+class field_Error(BaseException):
+    pass
+
+def _python_inv_mod_(value, modulus):
+    # value must be nonzero mod modulus
+    return pow(value, -1, modulus)
+
+_montgomery_constants_ = {}
+
+def _montgomery_pow_mod_(base, exponent, modulus):
+    # with R = 2^256 > modulus and m' = -modulus^( -1 ) (mod R):
+    # REDC(T) = (T + ((T * m') mod R) * modulus) / R === T / R (mod modulus)
+    # x is kept as x * R; x * R and y * R multiply to REDC(x * R * y * R)
+    constants = _montgomery_constants_.get(modulus)
+    if constants is None:
+        R = 1 << 256
+        constants = (R - 1, R - pow(modulus, -1, R), R * R % modulus)
+        _montgomery_constants_[modulus] = constants
+    mask, m_prime, R2 = constants
+    def redc(T):
+        T = (T + ((T & mask) * m_prime & mask) * modulus) >> 256
+        return T - modulus if T >= modulus else T
+    x = redc(base % modulus * R2)
+    acc = redc(R2)
+    for bit in bin(exponent)[2:]:
+        acc = redc(acc * acc)
+        if bit == '1':
+            acc = redc(acc * x)
+    return redc(acc)
+
+def _montgomery_inv_mod_(value, modulus):
+    # for a prime modulus m:
+    # n^( -1 ) === n^( (m - 1) -1 ) (mod m)
+    # n^( -1 ) === n^(  m - 2     ) (mod m)
+    return _montgomery_pow_mod_(value, modulus - 2, modulus)
+
+def _field_backend_entries_(name):
+    # (integer type, inversion, exponentiation) or None when unavailable
+    if name == 'python':
+        return int, _python_inv_mod_, pow
+    elif name == 'montgomery':
+        return int, _montgomery_inv_mod_, _montgomery_pow_mod_
+    elif name == 'gmpy2':
+        try:
+            import gmpy2
+        except ImportError:
+            return None
+        return gmpy2.mpz, gmpy2.invert, gmpy2.powmod
+    raise field_Error
+
+def field_backends_available():
+    return tuple(name for name in ('python', 'gmpy2', 'montgomery')
+                 if _field_backend_entries_(name) is not None)
+
+def set_field_backend(name):
+    global _field_backend_, _field_int_, _inv_mod_, _pow_mod_
+    assert type(name) is str
+    entries = _field_backend_entries_(name)
+    if entries is None:
+        raise field_Error
+    instrumented = _instrumentation_enabled_
+    if instrumented:
+        instrumentation_disable()
+    _field_backend_ = name
+    _field_int_, _inv_mod_, _pow_mod_ = entries
+    if instrumented:
+        instrumentation_enable()
+
+def get_field_backend():
+    return _field_backend_
+
+def _field_backend_default_():
+    name = os.environ.get('SECP256R1_FIELD_BACKEND')
+    if name is None:
+        name = 'gmpy2' if _field_backend_entries_('gmpy2') else 'python'
+    entries = _field_backend_entries_(name)
+    if entries is None:
+        raise field_Error
+    return (name,) + entries
+
+_field_backend_, _field_int_, _inv_mod_, _pow_mod_ = (
+        _field_backend_default_())
+
+
+
+
+
+
+
+
+
+
 _p_     = p
 _FpTAG_ = 'Fp'
 
@@ -69,12 +240,41 @@ def fp_sub(elm1, elm2):
     return fp_add(elm1, fp_neg(elm2))
 
 def fp_inv(elm):
-    # n^( -1 ) === n^( (p - 1) -1 ) (mod p)
-    # n^( -1 ) === n^(  p - 2     ) (mod p)
     assert _is_an_fp_representation_(elm)
     if elm[1] == 0:
         raise fp_Error
-    return _FpTAG_, pow(elm[1], _p_ - 2, _p_)
+    return _FpTAG_, int(_inv_mod_(elm[1], _p_))
+
+def fp_batch_inv(elms):
+    """
+    return the inverses of all elements at the cost of one inversion
+    """
+    elms = tuple(elms)
+    for elm in elms:
+        assert _is_an_fp_representation_(elm)
+    values = _batch_inv_([elm[1] for elm in elms], _p_, fp_Error)
+    return tuple((_FpTAG_, int(value)) for value in values)
+
+def _batch_inv_(values, modulus, error):
+    # Montgomery's trick: with prefix products c_i = v_0 * ... * v_i,
+    # 1 / v_i = c_(i-1) / c_i and 1 / c_(i-1) = v_i / c_i, so one
+    # inversion of c_(n-1) and about 3n multiplications give every 1 / v_i
+    prefix = []
+    acc = 1
+    for value in values:
+        if value % modulus == 0:
+            raise error
+        acc = acc * value % modulus
+        prefix.append(acc)
+    if not prefix:
+        return []
+    inv = _inv_mod_(acc, modulus)
+    result = [None] * len(prefix)
+    for i in range(len(prefix) - 1, 0, -1):
+        result[i] = inv * prefix[i - 1] % modulus
+        inv = inv * values[i] % modulus
+    result[0] = inv
+    return result
 
 def fp_mul(elm1, elm2):
     assert _is_an_fp_representation_(elm1)
@@ -98,7 +298,7 @@ def fp_sqrt(elm, parity=None):
     # m   === n^( (p + 1) / 4 ) (mod p)
     assert _is_an_fp_representation_(elm)
     assert parity is None or type(parity) is int
-    candidate = _FpTAG_, pow(elm[1], (_p_ + 1) // 4, _p_)
+    candidate = _FpTAG_, int(_pow_mod_(elm[1], (_p_ + 1) // 4, _p_))
     if fp_neq(fp_square(candidate), elm):
         raise fp_Error
     if parity is None or fp_parity_of(candidate) == parity & 1:
@@ -144,7 +344,17 @@ def fq_inv(elm):
     assert _is_an_fq_representation_(elm)
     if elm[1] == 0:
         raise fq_Error
-    return _FqTAG_, pow(elm[1], _q_ - 2, _q_)
+    return _FqTAG_, int(_inv_mod_(elm[1], _q_))
+
+def fq_batch_inv(elms):
+    """
+    return the inverses of all elements at the cost of one inversion
+    """
+    elms = tuple(elms)
+    for elm in elms:
+        assert _is_an_fq_representation_(elm)
+    values = _batch_inv_([elm[1] for elm in elms], _q_, fq_Error)
+    return tuple((_FqTAG_, int(value)) for value in values)
 
 def fq_mul(elm1, elm2):
     assert _is_an_fq_representation_(elm1)
@@ -164,6 +374,63 @@ def fq_to_lsb_first_bit_sequence_generator(elm):
 def fq_to_msb_first_bit_sequence(elm):
     return reversed(tuple(fq_to_lsb_first_bit_sequence_generator(elm)))
 
+#
+# Signed-digit recoding of scalars, least significant digit first
+#
+# width-w NAF: every nonzero digit d is odd with |d| < 2^(w-1), and any w
+# consecutive digits hold at most one nonzero digit, so about 1 / (w + 1)
+# of the digits are nonzero.  Only the odd multiples of a point are
+# needed, and -d * P costs nothing more than d * P.
+#
+#       n = sum( d[i] * 2^i )
+#
+# fixed windows: one digit per w bits with -2^(w-1) < d <= 2^(w-1), i.e.
+# the unsigned w-bit windows with the upper half borrowed from the next
+# window.
+#
+#       n = sum( d[i] * 2^(w * i) )
+#
+
+def fq_to_wnaf(elm, width):
+    assert _is_an_fq_representation_(elm)
+    assert type(width) is int and 2 <= width <= 8
+    return tuple(_wnaf_digits_(elm[1], width))
+
+def fq_to_signed_windows(elm, width):
+    assert _is_an_fq_representation_(elm)
+    assert type(width) is int and 1 <= width <= 8
+    return tuple(_signed_window_digits_(elm[1], width))
+
+def _wnaf_digits_(n, width):
+    n = int(n)
+    full = 1 << width
+    half = full >> 1
+    digits = []
+    while n:
+        if n & 1:
+            digit = n & (full - 1)
+            if digit >= half:
+                digit -= full
+            n -= digit
+        else:
+            digit = 0
+        digits.append(digit)
+        n >>= 1
+    return digits
+
+def _signed_window_digits_(n, width):
+    n = int(n)
+    full = 1 << width
+    half = full >> 1
+    digits = []
+    while n:
+        digit = n & (full - 1)
+        if digit > half:
+            digit -= full
+        digits.append(digit)
+        n = (n - digit) >> width
+    return digits
+
 
 
 
@@ -227,14 +494,15 @@ def e_from_octetstring(octetstring):
         elif len(octetstring) == 65 and octetstring[0] == 0x04:
             x = fp_from_octetstring(octetstring[1:33])
             y = fp_from_octetstring(octetstring[33:65])
-            assert _is_an_e_representation_((_ETAG_, x, y))
+            if not _is_on_e_curve_(x, y):
+                raise e_Error
             return _ETAG_, x, y
         elif len(octetstring) == 33 and octetstring[0] in {0x02, 0x03}:
             y_parity = octetstring[0] & 1
             x = fp_from_octetstring(octetstring[1:33])
             w = fp_add(fp_add(fp_cube(x), fp_mul(_a_, x)), _b_)
+            # fp_sqrt has checked y^2 == w, so (x, y) is on the curve
             y = fp_sqrt(w, parity=y_parity)
-            assert _is_an_e_representation_((_ETAG_, x, y))
             return _ETAG_, x, y
     except fp_Error:
         pass
@@ -315,6 +583,15 @@ def e_add(P, Q):
 def e_mul(P, k):
     assert _is_an_e_representation_(P)
     assert _is_an_fq_representation_(k)
+    if _reference_mode_:
+        return _e_mul_reference_(P, k)
+    if P == _Z_:
+        return _Z_
+    if P == _G_:
+        return _ej_to_e_(_ej_mul_generator_(k[1]))
+    return _ej_to_e_(_ej_mul_(_ej_from_e_(P), k[1]))
+
+def _e_mul_reference_(P, k):
     R = _Z_
     for bit in fq_to_msb_first_bit_sequence(k):
         R = e_dbl(R)
@@ -322,6 +599,282 @@ def e_mul(P, k):
             R = e_add(R, P)
     return R
 
+def e_mul2(P, k1, Q, k2):
+    """
+    return k1 * P + k2 * Q computed with one shared chain of doublings
+    """
+    assert _is_an_e_representation_(P)
+    assert _is_an_fq_representation_(k1)
+    assert _is_an_e_representation_(Q)
+    assert _is_an_fq_representation_(k2)
+    if _reference_mode_:
+        return e_add(_e_mul_reference_(P, k1), _e_mul_reference_(Q, k2))
+    if P == _G_:
+        return _ej_to_e_(_ej_add_(_ej_mul_generator_(k1[1]),
+                                  _ej_mul_(_ej_from_e_(Q), k2[1])))
+    return _ej_to_e_(_ej_mul2_(_ej_from_e_(P), k1[1], _ej_from_e_(Q), k2[1]))
+
+def _ej_mul_(J, n):
+    if J[2] == 0:
+        return _EJ_Z_
+    return _ej_multi_mul_([(_ej_odd_multiples_table_(J), n)])
+
+#
+# Variable-base multiplication with width-w NAF digits
+#
+# The table of a point holds its odd multiples in affine coordinates,
+# indexed by the digit itself: table[d] = d * P for odd d, with the
+# negative digits at the negative (from the end) indexes.  A table of
+# width w has 2^(w-2) distinct points and makes a 256-bit multiplication
+# cost about 256 / (w + 1) mixed additions.
+#
+
+_EJ_WNAF_WIDTH_ = 5
+
+def _ej_odd_multiples_table_(J, width=_EJ_WNAF_WIDTH_):
+    # J must be finite
+    D = _ej_dbl_(J)
+    odd = [J]
+    for _ in range((1 << (width - 2)) - 1):
+        odd.append(_ej_add_(odd[-1], D))
+    return _ej_odd_multiples_table_from_affine_(_ej_batch_to_affine_(odd))
+
+def _ej_odd_multiples_table_from_affine_(odd):
+    # odd = [P, 3P, 5P, ...] in affine coordinates
+    table = [None] * (4 * len(odd))
+    for i, (x, y) in enumerate(odd):
+        table[2 * i + 1] = x, y
+        table[-(2 * i + 1)] = x, _p_ - y
+    return tuple(table)
+
+def _ej_multi_mul_(pairs):
+    # sum of n * P over (odd multiples table of P, n) pairs with one
+    # shared doubling chain
+    terms = [(table, _wnaf_digits_(n, len(table).bit_length() - 1))
+             for table, n in pairs]
+    R = _EJ_Z_
+    for i in range(max(len(digits) for _, digits in terms) - 1, -1, -1):
+        R = _ej_dbl_(R)
+        for table, digits in terms:
+            if i < len(digits):
+                digit = digits[i]
+                if digit != 0:
+                    R = _ej_add_affine_(R, table[digit])
+    return R
+
+def _ej_eq_(J1, J2):
+    X1, Y1, Z1 = J1
+    X2, Y2, Z2 = J2
+    if Z1 == 0 or Z2 == 0:
+        return Z1 == Z2
+    Z1Z1 = Z1 * Z1 % _p_
+    Z2Z2 = Z2 * Z2 % _p_
+    return (X1 * Z2Z2 % _p_ == X2 * Z1Z1 % _p_ and
+            Y1 * Z2 * Z2Z2 % _p_ == Y2 * Z1 * Z1Z1 % _p_)
+
+def _ej_mul2_(J1, n1, J2, n2):
+    # interleaved width-w NAF over both scalars
+    pairs = [(_ej_odd_multiples_table_(J), n)
+             for J, n in ((J1, n1), (J2, n2)) if J[2] != 0]
+    if not pairs:
+        return _EJ_Z_
+    return _ej_multi_mul_(pairs)
+
+#
+# Jacobian coordinates (X, Y, Z) over plain integers mod p
+#
+#       x = X / Z^2
+#       y = Y / Z^3
+#
+# A point with Z == 0 is the point at infinity.  None of the operations
+# below need a field inversion; only _ej_to_e_() pays for one.
+#
+
+_EJ_Z_ = 1, 1, 0
+
+def _ej_from_e_(P):
+    _, (_, x), (_, y) = P
+    if P == _Z_:
+        return _EJ_Z_
+    return _field_int_(x), _field_int_(y), 1
+
+def _ej_to_e_(J):
+    X, Y, Z = J
+    if Z == 0:
+        return _Z_
+    zinv = _inv_mod_(Z, _p_)
+    zinv2 = zinv * zinv % _p_
+    return (_ETAG_, fp(int(X * zinv2 % _p_)),
+                    fp(int(Y * zinv2 * zinv % _p_)))
+
+def _ej_dbl_(J):
+    # with a = -3 (dbl-2001-b):
+    # delta = Z^2, gamma = Y^2, beta = X * gamma
+    # alpha = 3 * (X - delta) * (X + delta)
+    # X3 = alpha^2 - 8 * beta
+    # Z3 = (Y + Z)^2 - gamma - delta
+    # Y3 = alpha * (4 * beta - X3) - 8 * gamma^2
+    X, Y, Z = J
+    if Z == 0 or Y == 0:
+        return _EJ_Z_
+    delta = Z * Z % _p_
+    gamma = Y * Y % _p_
+    beta = X * gamma % _p_
+    alpha = 3 * (X - delta) * (X + delta) % _p_
+    X3 = (alpha * alpha - 8 * beta) % _p_
+    Z3 = ((Y + Z) * (Y + Z) - gamma - delta) % _p_
+    Y3 = (alpha * (4 * beta - X3) - 8 * gamma * gamma) % _p_
+    return X3, Y3, Z3
+
+def _ej_add_(J1, J2):
+    # U1 = X1 * Z2^2, U2 = X2 * Z1^2, S1 = Y1 * Z2^3, S2 = Y2 * Z1^3
+    # H = U2 - U1, R = S2 - S1
+    # X3 = R^2 - H^3 - 2 * U1 * H^2
+    # Y3 = R * (U1 * H^2 - X3) - S1 * H^3
+    # Z3 = Z1 * Z2 * H
+    X1, Y1, Z1 = J1
+    X2, Y2, Z2 = J2
+    if Z1 == 0:
+        return J2
+    if Z2 == 0:
+        return J1
+    Z1Z1 = Z1 * Z1 % _p_
+    Z2Z2 = Z2 * Z2 % _p_
+    U1 = X1 * Z2Z2 % _p_
+    U2 = X2 * Z1Z1 % _p_
+    S1 = Y1 * Z2 * Z2Z2 % _p_
+    S2 = Y2 * Z1 * Z1Z1 % _p_
+    H = (U2 - U1) % _p_
+    R = (S2 - S1) % _p_
+    if H == 0:
+        return _ej_dbl_(J1) if R == 0 else _EJ_Z_
+    HH = H * H % _p_
+    HHH = H * HH % _p_
+    V = U1 * HH % _p_
+    X3 = (R * R - HHH - 2 * V) % _p_
+    Y3 = (R * (V - X3) - S1 * HHH) % _p_
+    Z3 = Z1 * Z2 * H % _p_
+    return X3, Y3, Z3
+
+def _ej_add_affine_(J1, A2):
+    # the same as _ej_add_() with Z2 = 1
+    X1, Y1, Z1 = J1
+    x2, y2 = A2
+    if Z1 == 0:
+        return x2, y2, 1
+    Z1Z1 = Z1 * Z1 % _p_
+    U2 = x2 * Z1Z1 % _p_
+    S2 = y2 * Z1 * Z1Z1 % _p_
+    H = (U2 - X1) % _p_
+    R = (S2 - Y1) % _p_
+    if H == 0:
+        return _ej_dbl_(J1) if R == 0 else _EJ_Z_
+    HH = H * H % _p_
+    HHH = H * HH % _p_
+    V = X1 * HH % _p_
+    X3 = (R * R - HHH - 2 * V) % _p_
+    Y3 = (R * (V - X3) - Y1 * HHH) % _p_
+    Z3 = Z1 * H % _p_
+    return X3, Y3, Z3
+
+#
+# Fixed-base multiplication of the generator G
+#
+# The scalar is recoded into signed w-bit windows, -2^(w-1) < d <= 2^(w-1).
+# For every window i the table holds the affine multiples
+# j * 2^(w * i) * G for 1 <= j <= 2^(w-1); a negative digit uses the
+# negated entry.  Then n * G is the sum of one table entry per nonzero
+# window, without any doubling.  The table is built on first use and kept
+# afterwards.
+#
+
+_e_generator_table_width_ = 4
+_e_generator_table_       = None
+
+def e_set_generator_table_width(width):
+    """
+    choose the window width of the fixed-base table for G (1 to 8)
+
+    A table of width w holds ceil(257 / w) * 2^(w-1) points and makes a
+    multiplication of G cost about 256 / w point additions.
+    """
+    global _e_generator_table_width_, _e_generator_table_
+    assert type(width) is int and 1 <= width <= 8
+    if width != _e_generator_table_width_:
+        _e_generator_table_width_ = width
+        _e_generator_table_       = None
+
+def e_get_generator_table_width():
+    return _e_generator_table_width_
+
+def _e_generator_table_get_():
+    global _e_generator_table_
+    if _e_generator_table_ is None:
+        _e_generator_table_ = _e_generator_table_build_(
+                _e_generator_table_width_)
+    return _e_generator_table_
+
+def _e_generator_table_build_(width):
+    rows = []
+    base = _ej_from_e_(_G_)
+    size = 1 << (width - 1)
+    for _ in range((_q_.bit_length() + width) // width):
+        row = [base]
+        for _ in range(2, size + 1):
+            row.append(_ej_add_(row[-1], base))
+        base = _ej_dbl_(row[-1])
+        rows.append(row)
+    flat = _ej_batch_to_affine_([J for row in rows for J in row])
+    return width, tuple(tuple(flat[i:i + size])
+                        for i in range(0, len(flat), size))
+
+def _ej_batch_to_affine_(Js):
+    # all points must be finite
+    zinvs = _batch_inv_([Z for _, _, Z in Js], _p_, e_Error)
+    affine = []
+    for (X, Y, _), zinv in zip(Js, zinvs):
+        zinv2 = zinv * zinv % _p_
+        affine.append((X * zinv2 % _p_, Y * zinv2 * zinv % _p_))
+    return affine
+
+def _ej_mul_generator_(n):
+    width, rows = _e_generator_table_get_()
+    R = _EJ_Z_
+    for row, digit in zip(rows, _signed_window_digits_(n, width)):
+        if digit > 0:
+            R = _ej_add_affine_(R, row[digit - 1])
+        elif digit < 0:
+            x, y = row[-digit - 1]
+            R = _ej_add_affine_(R, (x, _p_ - y))
+    return R
+
+def _e_generator_table_to_octetstring_():
+    # width (1 octet) followed by x || y (32 + 32 octets) of every entry
+    width, rows = _e_generator_table_get_()
+    return bytes([width]) + b''.join(
+            int(x).to_bytes(length=32, byteorder='big', signed=False) +
+            int(y).to_bytes(length=32, byteorder='big', signed=False)
+            for row in rows for x, y in row)
+
+def _e_generator_table_load_octetstring_(octetstring):
+    global _e_generator_table_width_, _e_generator_table_
+    width = octetstring[0]
+    if not 1 <= width <= 8:
+        raise e_Error
+    size = 1 << (width - 1)
+    count = (_q_.bit_length() + width) // width
+    if len(octetstring) != 1 + 64 * size * count:
+        raise e_Error
+    entries = []
+    for offset in range(1, len(octetstring), 64):
+        x = int.from_bytes(octetstring[offset:offset + 32], byteorder='big')
+        y = int.from_bytes(octetstring[offset + 32:offset + 64],
+                           byteorder='big')
+        entries.append((_field_int_(x), _field_int_(y)))
+    _e_generator_table_width_ = width
+    _e_generator_table_ = width, tuple(tuple(entries[i:i + size])
+                                       for i in range(0, len(entries), size))
+
 
 
 
@@ -334,17 +887,17 @@ def e_mul(P, k):
 class asn1_Error(BaseException):
     pass
 
+#
+# The parser works on a memoryview of the input and describes every
+# element by offsets into it, so nothing is copied while walking the
+# structure.  Octets are only copied when a caller asks for bytes.
+#
+
 def asn1_parse_integer(octetstring):
     """
     return an signed integer encoded in this ASN.1 INTEGER
     """
-    assert type(octetstring) is bytes
-    T, L, V, X = _asn1_extract_T_L_V_X_from_(octetstring)
-    assert _asn1_L_value_(L) == len(V)
-    if len(X) != 0:
-        raise asn1_Error
-    if T != b'\x02':
-        raise asn1_Error
+    V = _asn1_parse_single_element_value_(octetstring, 0x02)
     if len(V) >= 2 and V[0] == 0x00 and V[1] <= 0x7f:
         raise asn1_Error
     return int.from_bytes(V, byteorder='big', signed=True)
@@ -353,86 +906,84 @@ def asn1_parse_bitstring_as_octet_string(octetstring):
     """
     return an octet string encoded in this ASN.1 BIT STRING
     """
-    assert type(octetstring) is bytes
-    T, L, V, X = _asn1_extract_T_L_V_X_from_(octetstring)
-    assert _asn1_L_value_(L) == len(V)
-    if len(X) != 0:
-        raise asn1_Error
-    if T != b'\x03':
-        raise asn1_Error
-    if V[0] != 0x00:
+    V = _asn1_parse_single_element_value_(octetstring, 0x03)
+    if len(V) == 0 or V[0] != 0x00:
         raise asn1_Error
-    return V[1:]
+    return bytes(V[1:])
 
 def asn1_parse_sequence(octetstring):
     """
     return a sequence of octet strings encoded in this ASN.1 SEQUENCE
     """
-    assert type(octetstring) is bytes
-    T, L, V, X = _asn1_extract_T_L_V_X_from_(octetstring)
-    assert _asn1_L_value_(L) == len(V)
-    if len(X) != 0:
-        raise asn1_Error
-    if T != b'\x30':
-        raise asn1_Error
-    items = ()
-    X = V
-    while len(X) != 0:
-        T, L, V, X = _asn1_extract_T_L_V_X_from_(X)
-        items += (T + L + V,)
-    return items
-
-def _asn1_extract_T_L_V_X_from_(stream):
-    X = stream
-    T, X = _asn1_extract_T_from_(X)
-    L, X = _asn1_extract_L_from_(X)
-    V, X = _asn1_extract_V_from_(X, length=_asn1_L_value_(L))
-    return T, L, V, X
-
-def _asn1_L_value_(L):
-    if len(L) == 0:
-        raise asn1_Error
-    elif len(L) == 1 and L[0] <= 0x7f:
-        return L[0]
-    elif len(L) == 2 and L[0] == 0x81 and L[1] >= 0x80:
-        return L[1]
-    elif len(L) == L[0] - 0x7f and L[0] >= 0x82 and L[1] != 0x00:
-        return int.from_bytes(L[1:], byteorder='big', signed=False)
-    else:
-        raise asn1_Error
+    return tuple(bytes(view) for view in asn1_iter_sequence(octetstring))
 
-def _asn1_extract_T_from_(stream):
-    if len(stream) == 0:
-        raise asn1_Error
-    return stream[:1], stream[1:]
+def asn1_iter_sequence(octetstring):
+    """
+    yield a memoryview of every element encoded in this ASN.1 SEQUENCE
 
-def _asn1_extract_L_from_(stream):
-    if len(stream) == 0:
+    The views share the input's memory; errors in an element are raised
+    when the iteration reaches it.
+    """
+    buf = _asn1_view_(octetstring)
+    start, end = _asn1_single_element_value_span_(buf, 0x30)
+    offset = start
+    while offset != end:
+        _, _, element_end = _asn1_element_span_(buf, offset, end)
+        yield buf[offset:element_end]
+        offset = element_end
+
+def _asn1_view_(octetstring):
+    assert isinstance(octetstring, (bytes, bytearray, memoryview))
+    return memoryview(octetstring).cast('B')
+
+def _asn1_parse_single_element_value_(octetstring, tag):
+    buf = _asn1_view_(octetstring)
+    start, end = _asn1_single_element_value_span_(buf, tag)
+    return buf[start:end]
+
+def _asn1_single_element_value_span_(buf, tag):
+    # the whole buffer must be exactly one element with this tag
+    T, start, end = _asn1_element_span_(buf, 0, len(buf))
+    if end != len(buf):
         raise asn1_Error
-    if stream[0] == 0x80:
+    if T != tag:
         raise asn1_Error
-    elif stream[0] <= 0x7f:
-        return stream[:1], stream[1:]
-    else:
-        return _asn1_extract_long_L_from_(stream)
+    return start, end
+
+def _asn1_element_span_(buf, offset, end):
+    """
+    return (T, start of V, end of V) of the element at buf[offset:end]
 
-def _asn1_extract_long_L_from_(stream):
-    length = stream[0] - 0x7f
-    if len(stream) < length:
+    T is a single octet.  L is either one octet 0x00 .. 0x7f, or 0x81
+    followed by one octet 0x80 .. 0xff, or 0x82 .. 0xff followed by that
+    many minus 0x80 octets of which the first is nonzero.
+    """
+    if end - offset < 2:
         raise asn1_Error
-    L, _ = stream[:length], stream[length:]
-    if (length == 2 and L[1] >= 0x80) or L[1] != 0x00:
-        return L, _
-    else:
+    T = buf[offset]
+    first = buf[offset + 1]
+    offset += 2
+    if first <= 0x7f:
+        length = first
+    elif first == 0x80:
         raise asn1_Error
-
-def _asn1_extract_V_from_(stream, length):
-    if len(stream) < length:
+    else:
+        count = first - 0x80
+        if end - offset < count:
+            raise asn1_Error
+        if first == 0x81 and buf[offset] < 0x80:
+            raise asn1_Error
+        if buf[offset] == 0x00:
+            raise asn1_Error
+        length = int.from_bytes(buf[offset:offset + count], byteorder='big',
+                                signed=False)
+        offset += count
+    if end - offset < length:
         raise asn1_Error
-    return stream[:length], stream[length:]
+    return T, offset, offset + length
 
 def _asn1_parse_a_sequence_of_two_signed_integers_(octetstring):
-    seq = asn1_parse_sequence(octetstring)
+    seq = tuple(asn1_iter_sequence(octetstring))
     if len(seq) != 2:
         raise asn1_Error
     octets1, octets2 = seq
@@ -457,13 +1008,66 @@ class ecdsa_Error(BaseException):
 def _ecdsa_signature_base_octetstring_to_integer_mod_q_(octetstring):
     # h <- mod_q(bitstring_to_integer(truncate_to_q_length(hash( ... ))))
     assert type(octetstring) is bytes
-    import hashlib
-    sha256_digester = hashlib.sha256()
-    sha256_digester.update(octetstring)
-    digest = sha256_digester.digest()
+    return _ecdsa_digest_to_integer_mod_q_(
+            hashlib.sha256(octetstring).digest())
+
+def _ecdsa_digest_to_integer_mod_q_(digest):
+    # the bit length of q is 256, so a SHA-256 digest is never truncated
+    if len(digest) != 32:
+        raise ecdsa_Error
     return int.from_bytes(digest, byteorder='big', signed=False) % __q__
 
-def _ecdsa_is_valid_Qhrs_quadruple_(Q, h, r, s):
+def _ecdsa_sha256_of_file_(file):
+    # hash a path or a binary file object without reading it into memory;
+    # regular files are memory-mapped, anything else is read in chunks
+    if isinstance(file, (str, bytes, os.PathLike)):
+        with open(file, 'rb') as stream:
+            return _ecdsa_sha256_of_file_(stream)
+    sha256_digester = hashlib.sha256()
+    chunk = 1 << 24
+    try:
+        fileno = file.fileno()
+        size = os.fstat(fileno).st_size
+        offset = file.tell()
+    except (AttributeError, OSError, ValueError):
+        size = None
+    if size is not None and size > offset:
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mapped:
+            with memoryview(mapped) as view:
+                for start in range(offset, size, chunk):
+                    sha256_digester.update(view[start:start + chunk])
+        file.seek(size)
+    else:
+        while True:
+            data = file.read(chunk)
+            if not data:
+                break
+            sha256_digester.update(data)
+    return sha256_digester.digest()
+
+def _ecdsa_is_valid_Qhrs_quadruple_(Q, h, r, s, Qtable=None):
+    # Q must come from e_nonzero_from_octetstring and h from a digest
+    if _reference_mode_:
+        return _ecdsa_is_valid_Qhrs_quadruple_reference_(Q, h, r, s)
+    if not (1 <= r <= __q__ - 1):
+        return False
+    if not (1 <= s <= __q__ - 1):
+        return False
+    w = _inv_mod_(s, __q__)
+    if Qtable is None:
+        Qtable = _ej_odd_multiples_table_(_ej_from_e_(Q))
+    X, _, Z = _ej_add_(_ej_mul_generator_(h * w % __q__),
+                       _ej_multi_mul_([(Qtable, r * w % __q__)]))
+    # x(R) = X / Z^2 is an integer in [0, p) and r = x(R) mod q, so x(R)
+    # is either r or r + q; compare without inverting Z
+    if Z == 0:
+        return False
+    ZZ = Z * Z % _p_
+    if X == r * ZZ % _p_:
+        return True
+    return r + __q__ < _p_ and X == (r + __q__) * ZZ % _p_
+
+def _ecdsa_is_valid_Qhrs_quadruple_reference_(Q, h, r, s):
     assert _is_an_e_representation_(Q) and not e_eq(Q, e(0))
     assert type(h) is int and (0 <= h <= __q__ - 1)
     assert type(r) is int
@@ -472,25 +1076,1144 @@ def _ecdsa_is_valid_Qhrs_quadruple_(Q, h, r, s):
         return False
     if not (1 <= s <= __q__ - 1):
         return False
-    R = e_add(e_mul(e(1), fq_div(fq(h), fq(s))),
-              e_mul(Q,    fq_div(fq(r), fq(s))))
+    R = e_add(_e_mul_reference_(e(1), fq_div(fq(h), fq(s))),
+              _e_mul_reference_(Q,    fq_div(fq(r), fq(s))))
     rr = e_to_integer(R) % __q__
     return rr == r
 
 def ecdsa_verify_signature(publickey, message, signature):
+    """
+    publickey may be an octet string or an ecdsa_PublicKey; octet strings
+    are looked up in the public key cache before being parsed
+    """
+    if _instrumentation_enabled_:
+        with _instrumentation_timer_('verify.total'):
+            return _ecdsa_verify_signature_(publickey, message, signature)
+    return _ecdsa_verify_signature_(publickey, message, signature)
+
+def _ecdsa_verify_signature_(publickey, message, signature):
+    assert type(publickey) is bytes or isinstance(publickey, ecdsa_PublicKey)
+    assert type(message) is bytes
+    assert type(signature) is bytes
+    if type(publickey) is bytes:
+        publickey = ecdsa_publickey_from_cache(publickey)
+    return publickey.verify(message, signature)
+
+def ecdsa_verify_digest(publickey, digest, signature):
+    """
+    the same as ecdsa_verify_signature for a message whose SHA-256 digest
+    has already been computed
+    """
+    assert type(publickey) is bytes or isinstance(publickey, ecdsa_PublicKey)
+    assert type(digest) is bytes
+    assert type(signature) is bytes
+    if type(publickey) is bytes:
+        publickey = ecdsa_publickey_from_cache(publickey)
+    return publickey.verify_digest(digest, signature)
+
+def ecdsa_verify_file(publickey, file, signature):
+    """
+    the same as ecdsa_verify_signature for a message stored in a file,
+    given as a path or a binary file object; the file is hashed
+    incrementally and never read into memory as a whole
+    """
+    return ecdsa_verify_digest(publickey, _ecdsa_sha256_of_file_(file),
+                               signature)
+
+# kept tables amortize their larger build cost over many verifications
+_ECDSA_PUBLICKEY_WNAF_WIDTH_ = 6
+
+class ecdsa_PublicKey:
+    """
+    a secp256r1 public key that is parsed and validated once
+
+    The table of multiples of Q used by verification is built on first use
+    and reused by every later verification under the same key.
+    """
+
+    __slots__ = ('octetstring', 'point', '_table_')
+
+    def __init__(self, publickey):
+        assert type(publickey) is bytes
+        try:
+            self.point = e_nonzero_from_octetstring(publickey)
+        except e_Error:
+            raise ecdsa_Error
+        self.octetstring = publickey
+        self._table_ = None
+
+    def verify(self, message, signature):
+        assert type(message) is bytes
+        assert type(signature) is bytes
+        h = _ecdsa_signature_base_octetstring_to_integer_mod_q_(message)
+        return self._verify_h_(h, signature)
+
+    def verify_digest(self, digest, signature):
+        assert type(digest) is bytes
+        return self._verify_h_(_ecdsa_digest_to_integer_mod_q_(digest),
+                               signature)
+
+    def _verify_h_(self, h, signature):
+        assert type(signature) is bytes
+        try:
+            r, s = _asn1_parse_a_sequence_of_two_signed_integers_(signature)
+        except asn1_Error:
+            raise ecdsa_Error
+        if _ecdsa_result_cache_enabled_ and not _reference_mode_:
+            return _ecdsa_verify_with_result_cache_(self, h, r, s)
+        return _ecdsa_is_valid_Qhrs_quadruple_(self.point, h, r, s,
+                                               self._window_table_())
+
+    def _window_table_(self):
+        if self._table_ is None:
+            table = _ecdsa_warm_state_table_(self.point)
+            if table is None:
+                table = _ej_odd_multiples_table_(
+                        _ej_from_e_(self.point), _ECDSA_PUBLICKEY_WNAF_WIDTH_)
+            self._table_ = table
+        return self._table_
+
+class _ecdsa_LRUCache_:
+    """
+    a bounded, thread-safe LRU mapping with hit and miss counters; a
+    capacity of 0 disables it, and entries older than ttl seconds (if
+    given) are treated as missing
+    """
+
+    def __init__(self, capacity, ttl=None):
+        assert type(capacity) is int and capacity >= 0
+        assert ttl is None or (type(ttl) in {int, float} and ttl > 0)
+        self.capacity = capacity
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items_ = collections.OrderedDict()
+        self._lock_ = threading.Lock()
+
+    def get(self, key):
+        with self._lock_:
+            entry = self._items_.get(key)
+            if entry is not None and entry[1] is not None:
+                if entry[1] <= time.monotonic():
+                    del self._items_[key]
+                    entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._items_.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        with self._lock_:
+            if self.capacity > 0:
+                deadline = None
+                if self.ttl is not None:
+                    deadline = time.monotonic() + self.ttl
+                self._items_[key] = value, deadline
+                self._items_.move_to_end(key)
+                self._evict_()
+
+    def set_capacity(self, capacity):
+        assert type(capacity) is int and capacity >= 0
+        with self._lock_:
+            self.capacity = capacity
+            self._evict_()
+
+    def _evict_(self):
+        while len(self._items_) > self.capacity:
+            self._items_.popitem(last=False)
+
+    def stats(self):
+        with self._lock_:
+            return {
+                'hits':     self.hits,
+                'misses':   self.misses,
+                'size':     len(self._items_),
+                'capacity': self.capacity,
+            }
+
+    def clear(self):
+        with self._lock_:
+            self._items_.clear()
+            self.hits   = 0
+            self.misses = 0
+
+#
+# A bounded LRU cache of ecdsa_PublicKey objects keyed by the octet string
+# they were parsed from.
+#
+
+_ecdsa_publickey_cache_ = _ecdsa_LRUCache_(4096)
+
+def ecdsa_publickey_from_cache(publickey):
+    """
+    return the cached ecdsa_PublicKey for this octet string, parsing and
+    caching it on a miss
+    """
     assert type(publickey) is bytes
+    pk = _ecdsa_publickey_cache_.get(publickey)
+    if pk is None:
+        pk = ecdsa_PublicKey(publickey)
+        _ecdsa_publickey_cache_.put(publickey, pk)
+    return pk
+
+def ecdsa_set_publickey_cache_capacity(capacity):
+    _ecdsa_publickey_cache_.set_capacity(capacity)
+
+def ecdsa_publickey_cache_stats():
+    return _ecdsa_publickey_cache_.stats()
+
+def ecdsa_clear_publickey_cache():
+    _ecdsa_publickey_cache_.clear()
+
+#
+# Verification result cache
+#
+# Off by default.  When enabled, the result of every verification that
+# gets as far as the point arithmetic is remembered under a 32-octet key
+#
+#       SHA-256( x(Q) || y(Q) || h || r || min(s, q - s) )
+#
+# where h is the message digest reduced mod q.  (r, s) and (r, q - s)
+# are valid or invalid together, so both forms share one entry.  Valid
+# and invalid results are kept in separate LRU caches so that a flood of
+# bad signatures cannot push out the good ones.
+#
+# A repeat arriving within the time an entry survives is a hit.  At a
+# steady rate of n distinct triples per second, a capacity of n * t keeps
+# the results of the last t seconds; the hit rate in
+# ecdsa_result_cache_stats() shows whether t covers the usual distance
+# between copies.
+#
+
+_ecdsa_result_cache_enabled_ = False
+_ecdsa_valid_result_cache_   = _ecdsa_LRUCache_(0)
+_ecdsa_invalid_result_cache_ = _ecdsa_LRUCache_(0)
+
+def ecdsa_enable_result_cache(capacity=65536, invalid_capacity=None,
+                              ttl=None):
+    """
+    remember up to capacity valid and invalid_capacity (by default the
+    same) invalid results, each for at most ttl seconds if given; this
+    clears the cache
+    """
+    global _ecdsa_result_cache_enabled_
+    global _ecdsa_valid_result_cache_, _ecdsa_invalid_result_cache_
+    if invalid_capacity is None:
+        invalid_capacity = capacity
+    _ecdsa_valid_result_cache_   = _ecdsa_LRUCache_(capacity, ttl)
+    _ecdsa_invalid_result_cache_ = _ecdsa_LRUCache_(invalid_capacity, ttl)
+    _ecdsa_result_cache_enabled_ = capacity > 0 or invalid_capacity > 0
+
+def ecdsa_disable_result_cache():
+    global _ecdsa_result_cache_enabled_
+    _ecdsa_result_cache_enabled_ = False
+    _ecdsa_valid_result_cache_.clear()
+    _ecdsa_invalid_result_cache_.clear()
+
+def ecdsa_result_cache_stats():
+    valid = _ecdsa_valid_result_cache_.stats()
+    invalid = _ecdsa_invalid_result_cache_.stats()
+    # every lookup asks the valid cache first and the invalid one after a
+    # miss there
+    lookups = valid['hits'] + valid['misses']
+    hits = valid['hits'] + invalid['hits']
+    return {
+        'enabled':          _ecdsa_result_cache_enabled_,
+        'lookups':          lookups,
+        'hits':             hits,
+        'hit_rate':         hits / lookups if lookups else 0.0,
+        'valid_hits':       valid['hits'],
+        'invalid_hits':     invalid['hits'],
+        'valid_size':       valid['size'],
+        'invalid_size':     invalid['size'],
+        'valid_capacity':   valid['capacity'],
+        'invalid_capacity': invalid['capacity'],
+    }
+
+def _ecdsa_verify_with_result_cache_(publickey, h, r, s):
+    if not (1 <= r <= __q__ - 1 and 1 <= s <= __q__ - 1):
+        return False
+    _, (_, x), (_, y) = publickey.point
+    key = hashlib.sha256(b''.join(
+            i.to_bytes(length=32, byteorder='big', signed=False)
+            for i in (x, y, h, r, min(s, __q__ - s)))).digest()
+    valid_cache, invalid_cache = (_ecdsa_valid_result_cache_,
+                                  _ecdsa_invalid_result_cache_)
+    if valid_cache.get(key) is not None:
+        return True
+    if invalid_cache.get(key) is not None:
+        return False
+    valid = _ecdsa_is_valid_Qhrs_quadruple_(publickey.point, h, r, s,
+                                            publickey._window_table_())
+    (valid_cache if valid else invalid_cache).put(key, True)
+    return valid
+
+#
+# Warm state snapshot
+#
+# The precomputed tables (the fixed-base table for G and the tables of
+# selected public keys) can be saved to a file and loaded by another
+# process instead of being rebuilt.  All integers are big-endian:
+#
+#       magic           8 octets    b'P256WARM'
+#       version         1 octet     1
+#       key width       1 octet     wNAF width of the key tables
+#       reserved        2 octets    0
+#       key count       4 octets
+#       checksum        32 octets   SHA-256 of everything that follows
+#       generator table             as _e_generator_table_to_octetstring_
+#       key entries                 key count times:
+#           public key  65 octets   uncompressed
+#           table       2^(w-2) times x || y (32 + 32 octets), the odd
+#                                   multiples Q, 3Q, 5Q, ...
+#
+# Loading checks the header and the checksum and installs the generator
+# table, which is small.  The file stays memory-mapped and a key table is
+# only decoded when that key is first used for verification.  The
+# checksum detects damaged files, not forged ones: a snapshot must be as
+# trusted as the code that loads it.
+#
+
+_ECDSA_WARM_STATE_MAGIC_   = b'P256WARM'
+_ECDSA_WARM_STATE_VERSION_ = 1
+_ECDSA_WARM_STATE_HEADER_  = 48
+
+# (mmap, key table width, {uncompressed public key: offset}) or None
+_ecdsa_warm_state_ = None
+
+def ecdsa_save_warm_state(path, publickeys=()):
+    """
+    write the generator table and the tables of publickeys (octet strings
+    or ecdsa_PublicKey objects) to path, replacing it atomically
+    """
+    width = _ECDSA_PUBLICKEY_WNAF_WIDTH_
+    body = [_e_generator_table_to_octetstring_()]
+    seen = set()
+    for publickey in publickeys:
+        if type(publickey) is bytes:
+            publickey = ecdsa_publickey_from_cache(publickey)
+        assert isinstance(publickey, ecdsa_PublicKey)
+        octets = e_to_octetstring(publickey.point)
+        if octets in seen:
+            continue
+        seen.add(octets)
+        table = publickey._window_table_()
+        if len(table) != 1 << width:
+            table = _ej_odd_multiples_table_(_ej_from_e_(publickey.point),
+                                             width)
+        body.append(octets)
+        body.extend(int(x).to_bytes(length=32, byteorder='big',
+                                    signed=False) +
+                    int(y).to_bytes(length=32, byteorder='big',
+                                    signed=False)
+                    for x, y in table[1:len(table) // 2:2])
+    body = b''.join(body)
+    header = (_ECDSA_WARM_STATE_MAGIC_ +
+              bytes([_ECDSA_WARM_STATE_VERSION_, width, 0, 0]) +
+              len(seen).to_bytes(length=4, byteorder='big') +
+              hashlib.sha256(body).digest())
+    temporary = os.fspath(path) + '.tmp'
+    with open(temporary, 'wb') as stream:
+        stream.write(header)
+        stream.write(body)
+    os.replace(temporary, path)
+
+def ecdsa_load_warm_state(path):
+    """
+    install the state saved by ecdsa_save_warm_state; raise ecdsa_Error
+    if the file is not a valid snapshot
+    """
+    global _ecdsa_warm_state_
+    with open(path, 'rb') as stream:
+        try:
+            mapped = mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ecdsa_Error
+    try:
+        state = _ecdsa_parse_warm_state_(mapped)
+    except (ecdsa_Error, e_Error):
+        mapped.close()
+        raise ecdsa_Error
+    ecdsa_unload_warm_state()
+    _ecdsa_warm_state_ = state
+
+def ecdsa_unload_warm_state():
+    """
+    forget the key tables of a loaded snapshot; the generator table and
+    tables already in use are kept
+    """
+    global _ecdsa_warm_state_
+    state, _ecdsa_warm_state_ = _ecdsa_warm_state_, None
+    if state is not None:
+        state[0].close()
+
+def _ecdsa_parse_warm_state_(mapped):
+    view = memoryview(mapped)
+    body = view[_ECDSA_WARM_STATE_HEADER_:]
+    try:
+        header = bytes(view[:_ECDSA_WARM_STATE_HEADER_])
+        if (len(header) != _ECDSA_WARM_STATE_HEADER_
+                or header[:8] != _ECDSA_WARM_STATE_MAGIC_
+                or header[8] != _ECDSA_WARM_STATE_VERSION_
+                or not (2 <= header[9] <= 8)
+                or header[10:12] != b'\x00\x00'):
+            raise ecdsa_Error
+        width = header[9]
+        count = int.from_bytes(header[12:16], byteorder='big')
+        if hashlib.sha256(body).digest() != header[16:48]:
+            raise ecdsa_Error
+        if len(body) == 0 or not (1 <= body[0] <= 8):
+            raise ecdsa_Error
+        generator_width = body[0]
+        generator_size = 1 + 64 * (1 << (generator_width - 1)) * (
+                (_q_.bit_length() + generator_width) // generator_width)
+        entry_size = 65 + 64 * (1 << (width - 2))
+        if len(body) != generator_size + count * entry_size:
+            raise ecdsa_Error
+        _e_generator_table_load_octetstring_(body[:generator_size])
+        index = {}
+        offset = _ECDSA_WARM_STATE_HEADER_ + generator_size
+        for _ in range(count):
+            index[bytes(view[offset:offset + 65])] = offset + 65
+            offset += entry_size
+    finally:
+        body.release()
+        view.release()
+    return mapped, width, index
+
+def _ecdsa_warm_state_table_(Q):
+    # the odd multiples table of Q from the loaded snapshot, or None
+    state = _ecdsa_warm_state_
+    if state is None:
+        return None
+    mapped, width, index = state
+    offset = index.get(e_to_octetstring(Q))
+    if offset is None:
+        return None
+    odd = []
+    for start in range(offset, offset + 64 * (1 << (width - 2)), 64):
+        x = int.from_bytes(mapped[start:start + 32], byteorder='big')
+        y = int.from_bytes(mapped[start + 32:start + 64], byteorder='big')
+        odd.append((_field_int_(x), _field_int_(y)))
+    _, (_, x), (_, y) = Q
+    if odd[0] != (x, y):
+        return None
+    return _ej_odd_multiples_table_from_affine_(odd)
+
+#
+# Randomized batch verification
+#
+# A signature (r, s) on h under Q is valid iff R = u1 * G + u2 * Q has
+# x(R) = r (mod q), where u1 = h / s and u2 = r / s.  Recovering R from r
+# leaves the sign of y(R) unknown, so with random z_i (z_1 = 1) a group of
+# m signatures is accepted iff
+#
+#       sum(z_i * u1_i) * G + sum(z_i * u2_i * Q_i) = sum(+-z_i * R_i)
+#
+# for one of the 2^m sign patterns.  The left-hand side is a single
+# multi-scalar multiplication with one chain of doublings.  A group that
+# fails is bisected while its halves hold more than two signatures.
+# Smaller ones are verified one by one, since checking a pair costs about
+# as much as verifying both and a failed pair needs both verifications
+# anyway.  Once more than a third of the groups checked in a call (and at
+# least two) have failed, the rest of the call is verified one by one: on
+# mostly invalid input a failed group check is pure overhead.
+#
+
+_ecdsa_batch_group_size_       = 4
+_ecdsa_batch_randomizer_bits_  = 64
+
+def ecdsa_verify_signatures_batch(items):
+    """
+    verify an iterable of (publickey, message, signature) triples at once
+
+    Return a tuple of booleans in input order.  Unlike
+    ecdsa_verify_signature, an unparsable public key or signature does not
+    raise ecdsa_Error; it is reported as False at its index.
+    """
+    items = tuple(items)
+    results = [False] * len(items)
+    prepared = []
+    for index, item in enumerate(items):
+        item = _ecdsa_prepare_item_(*item)
+        if item is not None:
+            prepared.append((index,) + item)
+    _ecdsa_verify_prepared_(prepared, results)
+    return tuple(results)
+
+def _ecdsa_verify_prepared_(prepared, results):
+    # set results[index] for every (index, ecdsa_PublicKey, h, r, s) with
+    # r and s in range
+    pending = []
+    for index, publickey, h, r, s in prepared:
+        R = _ecdsa_batch_R_(r)
+        if R is None:
+            results[index] = _ecdsa_is_valid_Qhrs_quadruple_(
+                    publickey.point, h, r, s, publickey._window_table_())
+        elif R is False:
+            results[index] = False
+        else:
+            pending.append((index, publickey, h, r, s, R))
+    ws = _batch_inv_([s for _, _, _, _, s, _ in pending], __q__, fq_Error)
+    pending = [item + (w,) for item, w in zip(pending, ws)]
+    size = _ecdsa_batch_group_size_
+    checked = failed = 0
+    for i in range(0, len(pending), size):
+        group = pending[i:i + size]
+        if failed >= 2 and 3 * failed > checked:
+            # mostly invalid input, on which group checks cost more than
+            # they save
+            _ecdsa_verify_one_by_one_(group, results)
+            continue
+        _ecdsa_verify_batch_group_(group, results)
+        checked += 1
+        failed += not all(results[index] for index, *_ in group)
+
+def _ecdsa_verify_requests_(items):
+    # ecdsa_verify_signature on every (publickey, message, signature) with
+    # the work shared as in ecdsa_verify_signatures_batch; an item that
+    # would raise gets its ecdsa_Error instance as the result
+    outcomes = [False] * len(items)
+    prepared = []
+    for index, (publickey, message, signature) in enumerate(items):
+        try:
+            if type(publickey) is bytes:
+                publickey = ecdsa_publickey_from_cache(publickey)
+            r, s = _asn1_parse_a_sequence_of_two_signed_integers_(signature)
+        except ecdsa_Error as error:
+            outcomes[index] = error
+            continue
+        except asn1_Error:
+            outcomes[index] = ecdsa_Error()
+            continue
+        if 1 <= r <= __q__ - 1 and 1 <= s <= __q__ - 1:
+            h = _ecdsa_signature_base_octetstring_to_integer_mod_q_(message)
+            prepared.append((index, publickey, h, r, s))
+    _ecdsa_verify_prepared_(prepared, outcomes)
+    return outcomes
+
+def _ecdsa_prepare_item_(publickey, message, signature):
+    # (ecdsa_PublicKey, h, r, s) with r and s in range, or None
     assert type(message) is bytes
+    h = _ecdsa_signature_base_octetstring_to_integer_mod_q_(message)
+    return _ecdsa_prepare_signature_(publickey, h, signature)
+
+def _ecdsa_prepare_signature_(publickey, h, signature):
+    # the signature is checked first: it is cheaper than parsing the key
+    assert type(publickey) is bytes or isinstance(publickey, ecdsa_PublicKey)
     assert type(signature) is bytes
     try:
-        Q    = e_nonzero_from_octetstring(publickey)
-        h    = _ecdsa_signature_base_octetstring_to_integer_mod_q_(message)
         r, s = _asn1_parse_a_sequence_of_two_signed_integers_(signature)
-        return _ecdsa_is_valid_Qhrs_quadruple_(Q, h, r, s)
-    except e_Error:
-        pass
+        if not (1 <= r <= __q__ - 1 and 1 <= s <= __q__ - 1):
+            return None
+        if type(publickey) is bytes:
+            publickey = ecdsa_publickey_from_cache(publickey)
+    except ecdsa_Error:
+        return None
     except asn1_Error:
-        pass
-    raise ecdsa_Error
+        return None
+    return publickey, h, r, s
+
+def _ecdsa_batch_R_(r):
+    # the Jacobian point with x = r and even y for batch verification,
+    # False if there is none, or None if x(R) may also be r + q, which is
+    # too rare to be worth batching
+    if r + __q__ < _p_:
+        return None
+    try:
+        return _ej_from_e_(e_from_octetstring(
+                b'\x02' + r.to_bytes(length=32, byteorder='big')))
+    except e_Error:
+        return False
+
+def ecdsa_verify_quorum(message, signers, threshold):
+    """
+    check that at least threshold of the (publickey, signature) pairs in
+    signers are valid signatures of message under distinct public keys
+
+    Return (reached, passed) where passed is a tuple of the indexes of the
+    signers found valid.  Checking stops as soon as the outcome is known,
+    so passed only covers the signers checked up to then.  Malformed keys
+    and signatures count as invalid without raising ecdsa_Error, and a
+    public key given more than once counts once, at the first of its
+    signatures found valid.
+    """
+    assert type(message) is bytes
+    assert type(threshold) is int and threshold >= 0
+    h = _ecdsa_signature_base_octetstring_to_integer_mod_q_(message)
+    pending = []
+    for index, (publickey, signature) in enumerate(signers):
+        prepared = _ecdsa_prepare_signature_(publickey, h, signature)
+        if prepared is not None:
+            pending.append((index,) + prepared)
+    # distinct[i] is the number of distinct keys in pending[i:], which
+    # bounds how many more signers can still count
+    distinct = [0] * (len(pending) + 1)
+    seen = set()
+    for i in range(len(pending) - 1, -1, -1):
+        seen.add(pending[i][1].point)
+        distinct[i] = len(seen)
+    results = {}
+    passed = []
+    passed_points = set()
+    i = 0
+    while len(passed) < threshold <= len(passed) + distinct[i]:
+        # a group never holds more signers than are still needed, so a
+        # quorum is not checked further than necessary
+        size = min(_ecdsa_batch_group_size_, threshold - len(passed))
+        group = [item for item in pending[i:i + size]
+                 if item[1].point not in passed_points]
+        i += size
+        batch = []
+        for index, publickey, h, r, s in group:
+            R = _ecdsa_batch_R_(r) if len(group) > 1 else None
+            if R is None:
+                results[index] = _ecdsa_is_valid_Qhrs_quadruple_(
+                        publickey.point, h, r, s, publickey._window_table_())
+            elif R is False:
+                results[index] = False
+            else:
+                batch.append((index, publickey, h, r, s, R))
+        if batch:
+            ws = _batch_inv_([item[4] for item in batch], __q__, fq_Error)
+            _ecdsa_verify_batch_group_(
+                    [item + (w,) for item, w in zip(batch, ws)], results)
+        for index, publickey, *_ in group:
+            if results[index] and publickey.point not in passed_points:
+                passed_points.add(publickey.point)
+                passed.append(index)
+    return len(passed) >= threshold, tuple(passed)
+
+def _ecdsa_verify_batch_group_(group, results):
+    if len(group) > 1 and not _reference_mode_:
+        if _ecdsa_batch_group_holds_(group):
+            for index, *_ in group:
+                results[index] = True
+            return
+        half = len(group) // 2
+        if half > 2:
+            _ecdsa_verify_batch_group_(group[:half], results)
+            _ecdsa_verify_batch_group_(group[half:], results)
+            return
+    _ecdsa_verify_one_by_one_(group, results)
+
+def _ecdsa_verify_one_by_one_(group, results):
+    for index, publickey, h, r, s, _, _ in group:
+        results[index] = _ecdsa_is_valid_Qhrs_quadruple_(
+                publickey.point, h, r, s, publickey._window_table_())
+
+def _ecdsa_batch_group_holds_(group):
+    bits = _ecdsa_batch_randomizer_bits_
+    zs = [1] + [secrets.randbits(bits) | 1 for _ in group[1:]]
+    n1 = 0
+    pairs = []
+    for z, (_, publickey, h, r, _, _, w) in zip(zs, group):
+        zw = z * w
+        n1 += zw * h
+        pairs.append((publickey._window_table_(), zw * r % __q__))
+    lhs = _ej_add_(_ej_mul_generator_(n1 % __q__),
+                   _ej_multi_mul_(pairs))
+    terms = [_ej_mul_(R, z) for z, (*_, R, _) in zip(zs, group)]
+    rhs = _EJ_Z_
+    for T in terms:
+        rhs = _ej_add_(rhs, T)
+    # walk all sign patterns in Gray code order, one addition per step
+    signs = [1] * len(terms)
+    for step in range(1, 1 << len(terms)):
+        if _ej_eq_(lhs, rhs):
+            return True
+        i = (step & -step).bit_length() - 1
+        X, Y, Z = _ej_dbl_(terms[i])
+        if signs[i] == 1:
+            Y = -Y % _p_
+        signs[i] = -signs[i]
+        rhs = _ej_add_(rhs, (X, Y, Z))
+    return _ej_eq_(lhs, rhs)
+
+#
+# Multi-process verification
+#
+# The parent process builds the fixed-base table for G once and publishes
+# it in a shared memory block; every worker loads the table from there
+# instead of rebuilding it.  Work is sent in chunks to amortize IPC, a
+# bounded number of chunks is in flight at any time, and results come
+# back in input order.
+#
+
+class ecdsa_VerifierPool:
+    """
+    verify (publickey, message, signature) triples on a pool of processes
+
+    Each item is checked with ecdsa_verify_signature in a worker, so the
+    results are the same as in-process verification, except that items
+    for which it would raise ecdsa_Error are reported as False.
+    """
+
+    def __init__(self, workers=None, chunksize=256):
+        assert workers is None or (type(workers) is int and workers >= 1)
+        assert type(chunksize) is int and chunksize >= 1
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = chunksize
+        table = _e_generator_table_to_octetstring_()
+        self._shm_ = shared_memory.SharedMemory(create=True, size=len(table))
+        # the segment outlives the process unless it is unlinked, so it is
+        # released if the pool cannot be built or is never closed
+        self._release_shm_ = weakref.finalize(
+                self, _ecdsa_verifier_pool_release_shm_, self._shm_)
+        try:
+            self._shm_.buf[:len(table)] = table
+            self._executor_ = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    initializer=_ecdsa_verifier_pool_worker_init_,
+                    initargs=(self._shm_.name, len(table)))
+        except BaseException:
+            self._release_shm_()
+            raise
+
+    def verify(self, items):
+        """
+        return a tuple of booleans, one per item, in input order
+        """
+        return tuple(self.verify_iter(items))
+
+    def verify_iter(self, items):
+        """
+        yield one boolean per item, in input order, while keeping at most
+        two chunks per worker in flight
+        """
+        items = iter(items)
+        inflight = collections.deque()
+        while True:
+            while len(inflight) < 2 * self.workers:
+                chunk = tuple(itertools.islice(items, self.chunksize))
+                if not chunk:
+                    break
+                inflight.append(self._executor_.submit(
+                        _ecdsa_verifier_pool_verify_chunk_, chunk))
+            if not inflight:
+                return
+            yield from inflight.popleft().result()
+
+    def close(self):
+        self._executor_.shutdown(wait=True)
+        self._release_shm_()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _ecdsa_verifier_pool_release_shm_(shm):
+    shm.close()
+    shm.unlink()
+
+def _ecdsa_verifier_pool_worker_init_(name, size):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        _e_generator_table_load_octetstring_(bytes(shm.buf[:size]))
+    finally:
+        shm.close()
+
+def _ecdsa_verifier_pool_verify_chunk_(chunk):
+    results = []
+    for publickey, message, signature in chunk:
+        try:
+            results.append(ecdsa_verify_signature(publickey, message,
+                                                  signature))
+        except ecdsa_Error:
+            results.append(False)
+    return results
+
+#
+# asyncio front-end
+#
+# Verification runs in an executor so that the event loop is never blocked
+# by point arithmetic.  ecdsa_AsyncVerifier bounds the number of requests
+# running in the executor and the number waiting for a slot; requests
+# beyond that fail fast with ecdsa_OverloadError.
+#
+
+class ecdsa_OverloadError(BaseException):
+    pass
+
+async def ecdsa_averify_signature(publickey, message, signature,
+                                  executor=None, timeout=None):
+    """
+    ecdsa_verify_signature run in executor (the loop default if None)
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(executor, ecdsa_verify_signature,
+                                  publickey, message, signature)
+    return await asyncio.wait_for(future, timeout)
+
+class ecdsa_AsyncVerifier:
+    """
+    verify signatures from coroutines with bounded concurrency
+
+    At most max_in_flight verifications run in the executor at once and at
+    most max_queued more wait for a slot.  A request that times out or is
+    cancelled before it starts is withdrawn from the executor; one that has
+    already started keeps its slot until it finishes.
+
+    Without an executor, a pool of max_in_flight threads is used and
+    max_in_flight defaults to 1: one thread keeps the event loop
+    responsive, but verification holds the GIL, so more threads would only
+    contend for it without verifying any faster.  For throughput on
+    several cores pass a concurrent.futures.ProcessPoolExecutor, which
+    costs pickling the arguments and a round trip per request;
+    max_in_flight then defaults to the number of CPUs.
+    """
+
+    def __init__(self, executor=None, max_in_flight=None, max_queued=1024,
+                 timeout=None):
+        assert max_in_flight is None or (type(max_in_flight) is int and
+                                         max_in_flight >= 1)
+        assert type(max_queued) is int and max_queued >= 0
+        if max_in_flight is None:
+            max_in_flight = 1 if executor is None else os.cpu_count() or 1
+        self.max_in_flight = max_in_flight
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._owns_executor_ = executor is None
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_in_flight)
+        self._executor_ = executor
+        self._slots_ = asyncio.Semaphore(self.max_in_flight)
+        self._queued_ = 0
+
+    @property
+    def queued(self):
+        return self._queued_
+
+    async def verify(self, publickey, message, signature, timeout=None):
+        """
+        return ecdsa_verify_signature(publickey, message, signature)
+
+        Raise ecdsa_OverloadError when the queue is full and
+        asyncio.TimeoutError when timeout (or the verifier default) expires
+        first.
+        """
+        if timeout is None:
+            timeout = self.timeout
+        if self._slots_.locked() and self._queued_ >= self.max_queued:
+            raise ecdsa_OverloadError
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        self._queued_ += 1
+        try:
+            await asyncio.wait_for(self._slots_.acquire(), timeout)
+        finally:
+            self._queued_ -= 1
+        try:
+            future = self._executor_.submit(ecdsa_verify_signature,
+                                            publickey, message, signature)
+        except BaseException:
+            self._slots_.release()
+            raise
+        future.add_done_callback(
+                lambda _: loop.call_soon_threadsafe(self._slots_.release))
+        remaining = (None if deadline is None else
+                     max(0, deadline - loop.time()))
+        try:
+            return await asyncio.wait_for(
+                    asyncio.shield(asyncio.wrap_future(future)), remaining)
+        except BaseException:
+            future.cancel()
+            raise
+
+    async def verify_many(self, items, timeout=None):
+        """
+        verify (publickey, message, signature) triples concurrently and
+        return their results in input order
+        """
+        return await asyncio.gather(*(self.verify(*item, timeout=timeout)
+                                      for item in items))
+
+    def close(self):
+        if self._owns_executor_:
+            self._executor_.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+#
+# Micro-batching scheduler
+#
+# Single verification requests from any number of threads or coroutines
+# are queued and verified in batches on one background thread, so that
+# concurrent requests share the inversion of their s values, one
+# generator multiplication per group and the cached key tables.  A batch
+# is started when max_batch_size requests are waiting or when the oldest
+# one has waited max_wait seconds, which bounds the extra latency a
+# request can pick up from batching.  Point arithmetic holds the GIL, so
+# one thread is as fast as several.
+#
+
+class ecdsa_VerificationScheduler:
+    """
+    verify single signatures in shared micro-batches
+
+    submit() returns a concurrent.futures.Future that resolves like
+    ecdsa_verify_signature: to True or False, or to ecdsa_Error for an
+    unparsable key or signature.  A future cancelled before its batch
+    starts is dropped.  Requests beyond max_queued waiting ones fail fast
+    with ecdsa_OverloadError.
+    """
+
+    def __init__(self, max_batch_size=32, max_wait=0.002, max_queued=4096):
+        assert type(max_batch_size) is int and max_batch_size >= 1
+        assert type(max_wait) in {int, float} and max_wait >= 0
+        assert type(max_queued) is int and max_queued >= 1
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_queued = max_queued
+        self.batches = 0
+        self.requests = 0
+        self._requests_ = collections.deque()
+        self._condition_ = threading.Condition()
+        self._closed_ = False
+        self._thread_ = threading.Thread(
+                target=self._run_, name='ecdsa_VerificationScheduler',
+                daemon=True)
+        self._thread_.start()
+
+    def submit(self, publickey, message, signature):
+        assert (type(publickey) is bytes or
+                isinstance(publickey, ecdsa_PublicKey))
+        assert type(message) is bytes
+        assert type(signature) is bytes
+        future = concurrent.futures.Future()
+        with self._condition_:
+            if self._closed_:
+                raise RuntimeError('ecdsa_VerificationScheduler is closed')
+            if len(self._requests_) >= self.max_queued:
+                raise ecdsa_OverloadError
+            self._requests_.append((time.monotonic(), future,
+                                    (publickey, message, signature)))
+            self._condition_.notify()
+        return future
+
+    def verify(self, publickey, message, signature, timeout=None):
+        """
+        submit a request and wait for its result from a thread
+        """
+        return self.submit(publickey, message, signature).result(timeout)
+
+    async def averify(self, publickey, message, signature, timeout=None):
+        """
+        submit a request and await its result from a coroutine
+        """
+        return await asyncio.wait_for(
+                asyncio.wrap_future(self.submit(publickey, message,
+                                                signature)),
+                timeout)
+
+    def stats(self):
+        with self._condition_:
+            return {
+                'batches':         self.batches,
+                'requests':        self.requests,
+                'mean_batch_size': (self.requests / self.batches
+                                    if self.batches else 0.0),
+                'queued':          len(self._requests_),
+            }
+
+    def _run_(self):
+        while True:
+            with self._condition_:
+                while not self._requests_ and not self._closed_:
+                    self._condition_.wait()
+                if not self._requests_:
+                    return
+                deadline = self._requests_[0][0] + self.max_wait
+                while (len(self._requests_) < self.max_batch_size
+                       and not self._closed_):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._condition_.wait(remaining)
+                batch = [self._requests_.popleft() for _ in
+                         range(min(len(self._requests_),
+                                   self.max_batch_size))]
+            self._verify_batch_(batch)
+
+    def _verify_batch_(self, batch):
+        live = [(future, item) for _, future, item in batch
+                if future.set_running_or_notify_cancel()]
+        try:
+            outcomes = _ecdsa_verify_requests_([item for _, item in live])
+        except BaseException as error:
+            for future, _ in live:
+                future.set_exception(error)
+            return
+        finally:
+            with self._condition_:
+                self.batches += 1
+                self.requests += len(live)
+        for (future, _), outcome in zip(live, outcomes):
+            if isinstance(outcome, BaseException):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def close(self):
+        """
+        stop accepting requests, finish the queued ones and stop the
+        background thread
+        """
+        with self._condition_:
+            self._closed_ = True
+            self._condition_.notify()
+        self._thread_.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+#
+# Streaming verification pipeline
+#
+# A pipeline is a chain of generator stages, each taking an iterator and
+# returning an iterator, so only one record is held in memory at a time:
+#
+#       decode:  octet stream  ->  (publickey, message, signature) or None
+#       digest:  records       ->  (publickey, h, signature) or None
+#       verify:  hashed        ->  (index, True / False / None)
+#
+# None marks a record that could not be decoded or parsed.  Any stage can
+# be replaced by a function with the same shape.
+#
+
+def ecdsa_decode_length_prefixed_records(stream):
+    """
+    yield (publickey, message, signature) from a binary stream where every
+    field is a 4-octet big-endian length followed by that many octets
+    """
+    while True:
+        fields = []
+        for _ in range(3):
+            header = _ecdsa_read_exactly_(stream, 4)
+            if header is None:
+                if fields:
+                    raise ecdsa_Error
+                return
+            length = int.from_bytes(header, byteorder='big', signed=False)
+            field = _ecdsa_read_exactly_(stream, length)
+            if field is None:
+                raise ecdsa_Error
+            fields.append(field)
+        yield tuple(fields)
+
+def _ecdsa_read_exactly_(stream, length):
+    data = stream.read(length)
+    if len(data) == 0 and length != 0:
+        return None
+    while len(data) < length:
+        more = stream.read(length - len(data))
+        if len(more) == 0:
+            raise ecdsa_Error
+        data += more
+    return data
+
+def ecdsa_decode_jsonl_records(stream):
+    """
+    yield (publickey, message, signature) from a binary stream of JSON
+    lines with hex-encoded "publickey", "message" and "signature" fields,
+    or None for a line that cannot be decoded
+    """
+    for line in stream:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            yield (bytes.fromhex(record['publickey']),
+                   bytes.fromhex(record['message']),
+                   bytes.fromhex(record['signature']))
+        except (ValueError, KeyError, TypeError):
+            yield None
+
+def ecdsa_pipeline_hash(records):
+    for record in records:
+        if record is None:
+            yield None
+            continue
+        publickey, message, signature = record
+        yield (publickey,
+               _ecdsa_signature_base_octetstring_to_integer_mod_q_(message),
+               signature)
+
+def ecdsa_pipeline_verify(hashed):
+    for index, item in enumerate(hashed):
+        if item is None:
+            yield index, None
+            continue
+        publickey, h, signature = item
+        try:
+            yield index, ecdsa_publickey_from_cache(publickey)._verify_h_(
+                    h, signature)
+        except ecdsa_Error:
+            yield index, None
+
+def ecdsa_pipeline_progress(results, report, interval=1.0):
+    """
+    pass results through, calling report(stats) at most every interval
+    seconds and once at the end
+    """
+    stats = {'records': 0, 'valid': 0, 'invalid': 0, 'malformed': 0,
+             'elapsed': 0.0, 'records_per_second': 0.0}
+    start = last = time.monotonic()
+    for result in results:
+        _, valid = result
+        stats['records'] += 1
+        stats['valid' if valid else
+              'invalid' if valid is False else 'malformed'] += 1
+        yield result
+        now = time.monotonic()
+        if now - last >= interval:
+            last = now
+            _ecdsa_pipeline_report_(report, stats, now - start)
+    _ecdsa_pipeline_report_(report, stats, time.monotonic() - start)
+
+def _ecdsa_pipeline_report_(report, stats, elapsed):
+    stats['elapsed'] = elapsed
+    stats['records_per_second'] = (stats['records'] / elapsed if elapsed else
+                                   0.0)
+    report(dict(stats))
+
+def ecdsa_verification_pipeline(source, decode=ecdsa_decode_jsonl_records,
+                                digest=ecdsa_pipeline_hash,
+                                verify=ecdsa_pipeline_verify,
+                                progress=None, progress_interval=1.0):
+    """
+    lazily yield (index, valid) for every record in source, a path or a
+    binary file object; valid is None for a malformed record
+    """
+    if isinstance(source, (str, bytes, os.PathLike)):
+        with open(source, 'rb') as stream:
+            yield from ecdsa_verification_pipeline(
+                    stream, decode, digest, verify, progress,
+                    progress_interval)
+        return
+    results = verify(digest(decode(source)))
+    if progress is not None:
+        results = ecdsa_pipeline_progress(results, progress, progress_interval)
+    yield from results
+
+def ecdsa_run_verification_pipeline(source, sink, **stages):
+    """
+    feed every (index, valid) result of the pipeline to sink(result)
+    """
+    for result in ecdsa_verification_pipeline(source, **stages):
+        sink(result)
 
 def ecdsa_compress_publickey(publickey):
     assert type(publickey) is bytes
@@ -510,7 +2233,179 @@ def ecdsa_decompress_publickey(publickey):
         pass
     raise ecdsa_Error
 
+#
+# Bulk conversion between the 33-byte and 65-byte public key forms
+#
+# Input is either an iterable of public keys (in any encoding accepted by
+# ecdsa_compress_publickey) or a contiguous buffer of fixed-width keys
+# (65 bytes each for compression, 33 bytes each for decompression).
+# Results are written as fixed-width records into out, which is allocated
+# when not given.  An invalid key does not stop the conversion: its
+# record is filled with zero bytes, which is never a valid encoding, and
+# its index is reported.  Keys are checked and converted on plain
+# integers:
+#
+#     y^2 === x^3 - 3x + b (mod p)
+#     y   === (x^3 - 3x + b)^( (p + 1) / 4 ) (mod p)
+#
+
+def ecdsa_compress_publickeys(publickeys, out=None, workers=None,
+                              chunksize=4096):
+    """
+    return (out, invalid) where out holds one 33-byte record per key and
+    invalid is the sorted list of indexes of keys that could not be read
+    """
+    return _ecdsa_bulk_convert_publickeys_(publickeys, out, 33, 65,
+                                           workers, chunksize)
+
+def ecdsa_decompress_publickeys(publickeys, out=None, workers=None,
+                                chunksize=4096):
+    """
+    return (out, invalid) where out holds one 65-byte record per key and
+    invalid is the sorted list of indexes of keys that could not be read
+    """
+    return _ecdsa_bulk_convert_publickeys_(publickeys, out, 65, 33,
+                                           workers, chunksize)
+
+def _ecdsa_bulk_convert_publickeys_(publickeys, out, width, buffer_width,
+                                    workers, chunksize):
+    assert workers is None or (type(workers) is int and workers >= 1)
+    assert type(chunksize) is int and chunksize >= 1
+    if isinstance(publickeys, (bytes, bytearray, memoryview)):
+        view = memoryview(publickeys).cast('B')
+        if len(view) % buffer_width != 0:
+            raise ecdsa_Error
+        count = len(view) // buffer_width
+        if out is None:
+            out = bytearray(count * width)
+        chunks = ((start, view[start * buffer_width:
+                               (start + chunksize) * buffer_width])
+                  for start in range(0, count, chunksize))
+    else:
+        chunks = _ecdsa_publickey_chunks_(publickeys, chunksize)
+    grow = out is None
+    if grow:
+        out = bytearray()
+    else:
+        target = memoryview(out).cast('B')
+    if workers is None or workers == 1:
+        results = ((start, _ecdsa_convert_publickey_chunk_(
+                            chunk, buffer_width, width))
+                   for start, chunk in chunks)
+    else:
+        results = _ecdsa_convert_publickey_chunks_in_pool_(
+                chunks, buffer_width, width, workers)
+    invalid = []
+    for start, (records, chunk_invalid) in results:
+        offset = start * width
+        if grow:
+            out += records
+        elif offset + len(records) > len(target):
+            raise ecdsa_Error
+        else:
+            target[offset:offset + len(records)] = records
+        invalid.extend(start + i for i in chunk_invalid)
+    if not grow:
+        target.release()
+    return out, invalid
+
+def _ecdsa_publickey_chunks_(publickeys, chunksize):
+    publickeys = iter(publickeys)
+    start = 0
+    while True:
+        chunk = tuple(bytes(publickey) for publickey in
+                      itertools.islice(publickeys, chunksize))
+        if not chunk:
+            return
+        yield start, chunk
+        start += len(chunk)
+
+def _ecdsa_convert_publickey_chunks_in_pool_(chunks, buffer_width, width,
+                                             workers):
+    starts = collections.deque()
+    def arguments():
+        for start, chunk in chunks:
+            starts.append(start)
+            if type(chunk) is memoryview:
+                chunk = bytes(chunk)
+            yield chunk, buffer_width, width
+    for result in _ecdsa_pool_map_(_ecdsa_convert_publickey_chunk_,
+                                   arguments(), workers):
+        yield starts.popleft(), result
+
+def _ecdsa_pool_map_(function, arguments, workers):
+    # yield function(*args) for every args tuple, in order, from a pool of
+    # processes with at most two calls per worker in flight
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        inflight = collections.deque()
+        for args in arguments:
+            inflight.append(pool.submit(function, *args))
+            if len(inflight) >= 2 * workers:
+                yield inflight.popleft().result()
+        while inflight:
+            yield inflight.popleft().result()
+
+def _ecdsa_convert_publickey_chunk_(chunk, buffer_width, width):
+    # chunk is a tuple of keys or a buffer of buffer_width-byte keys;
+    # return (bytes of width-byte records, local indexes of invalid keys)
+    if type(chunk) is tuple:
+        keys = chunk
+    else:
+        keys = [chunk[i:i + buffer_width]
+                for i in range(0, len(chunk), buffer_width)]
+    records = bytearray(len(keys) * width)
+    invalid = []
+    for i, key in enumerate(keys):
+        point = _ecdsa_publickey_to_raw_point_(key)
+        if point is None:
+            invalid.append(i)
+            continue
+        x, y = point
+        offset = i * width
+        if width == 33:
+            records[offset] = 0x02 | (y & 1)
+        else:
+            records[offset] = 0x04
+            records[offset + 33:offset + 65] = y.to_bytes(32, 'big')
+        records[offset + 1:offset + 33] = x.to_bytes(32, 'big')
+    return bytes(records), invalid
+
+def _ecdsa_publickey_to_raw_point_(key):
+    # return (x, y) for a valid nonzero point encoding, None otherwise
+    if len(key) == 65 and key[0] == 0x04:
+        x = int.from_bytes(key[1:33], 'big')
+        y = int.from_bytes(key[33:65], 'big')
+        if x >= _p_ or y >= _p_:
+            return None
+        if (y * y - (x * x * x - 3 * x + b)) % _p_ != 0:
+            return None
+        return x, y
+    elif len(key) == 33 and key[0] in {0x02, 0x03}:
+        x = int.from_bytes(key[1:33], 'big')
+        if x >= _p_:
+            return None
+        w = (x * x * x - 3 * x + b) % _p_
+        y = int(_pow_mod_(w, (_p_ + 1) // 4, _p_))
+        if y * y % _p_ != w:
+            return None
+        if y & 1 != key[0] & 1:
+            y = _p_ - y
+        return x, y
+    return None
+
 def ecdsa_extract_publickey_octetstring_from_certificate(certificate):
+    if _instrumentation_enabled_:
+        with _instrumentation_timer_('certificate.total'):
+            _, pk_octets = (
+                _ecdsa_extract_subjectpublickeyinfo_from_certificate_(
+                        certificate))
+            return pk_octets
+    _, pk_octets = _ecdsa_extract_subjectpublickeyinfo_from_certificate_(
+            certificate)
+    return pk_octets
+
+def _ecdsa_extract_subjectpublickeyinfo_from_certificate_(certificate):
+    # return a view of the SubjectPublicKeyInfo and the public key octets
     try:
 
         #
@@ -520,7 +2415,7 @@ def ecdsa_extract_publickey_octetstring_from_certificate(certificate):
         #   signatureValue          BIT STRING
         # }
         #
-        tbscert, _, _ = asn1_parse_sequence(certificate)
+        tbscert, _, _ = asn1_iter_sequence(certificate)
 
         #
         # TBSCertificate ::= SEQUENCE {
@@ -539,7 +2434,7 @@ def ecdsa_extract_publickey_octetstring_from_certificate(certificate):
         #                           -- If present, version MUST be v3
         # }
         #
-        _, _, _, _, _, _, pk_info, *_ = asn1_parse_sequence(tbscert)
+        _, _, _, _, _, _, pk_info, *_ = asn1_iter_sequence(tbscert)
 
         #
         # SubjectPublicKeyInfo ::= SEQUENCE {
@@ -547,7 +2442,7 @@ def ecdsa_extract_publickey_octetstring_from_certificate(certificate):
         #   subjectPublicKey        BIT STRING
         # }
         #
-        alg, pk_bits = asn1_parse_sequence(pk_info)
+        alg, pk_bits = asn1_iter_sequence(pk_info)
 
         #
         # From Section 2.1 of RFC5480:
@@ -599,7 +2494,7 @@ def ecdsa_extract_publickey_octetstring_from_certificate(certificate):
         pk_octets = asn1_parse_bitstring_as_octet_string(pk_bits)
         _ecdsa_ensure_good_ecdsa_publickey_(pk_octets)
 
-        return pk_octets
+        return pk_info, pk_octets
 
     except asn1_Error:
         pass
@@ -629,3 +2524,835 @@ def _ecdsa_ensure_good_ecdsa_publickey_(pk_octets):
     except e_Error:
         pass
     raise ecdsa_Error
+
+
+
+
+
+
+
+
+
+
+#
+# Certificate signatures
+#
+# A certificate is parsed once into the fields needed to check its
+# signature and kept in a bounded LRU cache keyed by its SHA-256
+# fingerprint, together with the issuer keys it has already been verified
+# under.  Only successful verifications are remembered.
+#
+
+_ECDSA_WITH_SHA256_ = bytes.fromhex('300a06082a8648ce3d040302')
+
+class _ecdsa_ParsedCertificate_:
+
+    __slots__ = ('tbs_h', 'r', 's', 'issuer', 'subject', 'publickey',
+                 'verified_by')
+
+    def __init__(self, certificate):
+        try:
+            #
+            # Certificate ::= SEQUENCE {
+            #   tbsCertificate          TBSCertificate,
+            #   signatureAlgorithm      AlgorithmIdentifier,
+            #   signatureValue          BIT STRING
+            # }
+            #
+            tbscert, alg, sig_bits = asn1_iter_sequence(certificate)
+            fields = tuple(asn1_iter_sequence(tbscert))
+            #
+            # version [0] EXPLICIT is absent in v1 certificates
+            #
+            k = 1 if fields[0][0] == 0xa0 else 0
+            tbs_alg = fields[k + 1]
+            self.issuer = bytes(fields[k + 2])
+            self.subject = bytes(fields[k + 4])
+            if alg == _ECDSA_WITH_SHA256_ and tbs_alg == _ECDSA_WITH_SHA256_:
+                signature = asn1_parse_bitstring_as_octet_string(sig_bits)
+                self.r, self.s = (
+                        _asn1_parse_a_sequence_of_two_signed_integers_(
+                                signature))
+            else:
+                self.r = self.s = None
+            self.tbs_h = _ecdsa_digest_to_integer_mod_q_(
+                    hashlib.sha256(tbscert).digest())
+        except asn1_Error:
+            raise ecdsa_Error
+        except (ValueError, IndexError):
+            raise ecdsa_Error
+        try:
+            extract = ecdsa_extract_publickey_octetstring_from_certificate
+            self.publickey = extract(certificate)
+        except ecdsa_Error:
+            self.publickey = None
+        self.verified_by = set()
+
+_ecdsa_certificate_cache_ = _ecdsa_LRUCache_(1024)
+
+def _ecdsa_parsed_certificate_from_cache_(certificate):
+    assert isinstance(certificate, (bytes, bytearray, memoryview))
+    fingerprint = hashlib.sha256(certificate).digest()
+    parsed = _ecdsa_certificate_cache_.get(fingerprint)
+    if parsed is None:
+        parsed = _ecdsa_ParsedCertificate_(certificate)
+        _ecdsa_certificate_cache_.put(fingerprint, parsed)
+    return parsed
+
+def ecdsa_verify_certificate_signature(certificate, issuer):
+    """
+    verify the ecdsa-with-SHA256 signatureValue of a DER certificate over
+    its tbsCertificate
+
+    issuer is the issuer's DER certificate, its public key octet string,
+    or an ecdsa_PublicKey.  Return False if the signature does not verify
+    or does not use ecdsa-with-SHA256; raise ecdsa_Error if the
+    certificate or the issuer key cannot be parsed.
+    """
+    parsed = _ecdsa_parsed_certificate_from_cache_(certificate)
+    return _ecdsa_verify_parsed_certificate_(
+            parsed, _ecdsa_issuer_publickey_(issuer))
+
+def _ecdsa_issuer_publickey_(issuer):
+    if isinstance(issuer, ecdsa_PublicKey):
+        return issuer
+    assert type(issuer) is bytes
+    if len(issuer) != 0 and issuer[0] == 0x30:
+        issuer = _ecdsa_parsed_certificate_from_cache_(issuer).publickey
+        if issuer is None:
+            raise ecdsa_Error
+    return ecdsa_publickey_from_cache(issuer)
+
+def _ecdsa_verify_parsed_certificate_(parsed, publickey):
+    if publickey.octetstring in parsed.verified_by:
+        return True
+    if parsed.r is None:
+        return False
+    valid = _ecdsa_is_valid_Qhrs_quadruple_(publickey.point, parsed.tbs_h,
+                                            parsed.r, parsed.s,
+                                            publickey._window_table_())
+    if valid:
+        parsed.verified_by.add(publickey.octetstring)
+    return valid
+
+def ecdsa_verify_certificate_chain(chain, trust_anchor):
+    """
+    verify a leaf-first sequence of DER certificates up to trust_anchor
+
+    Every certificate must name the next one's subject as its issuer and
+    carry a signature that verifies under the next one's key, and the last
+    certificate must verify under trust_anchor (a certificate, a public
+    key octet string or an ecdsa_PublicKey), which the caller trusts.  A
+    self-signed certificate at the end of the chain proves nothing and is
+    not accepted in place of an anchor.
+
+    Only signatures and issuer/subject names are checked: validity
+    periods, basicConstraints (whether an issuer is a CA), key usage, path
+    length and other extensions are not, and have to be checked by the
+    caller before the result is used for a trust decision.
+    """
+    assert trust_anchor is not None
+    chain = tuple(chain)
+    if len(chain) == 0:
+        raise ecdsa_Error
+    parsed = [_ecdsa_parsed_certificate_from_cache_(c) for c in chain]
+    for child, parent in zip(parsed, parsed[1:]):
+        if child.issuer != parent.subject or parent.publickey is None:
+            return False
+        if not _ecdsa_verify_parsed_certificate_(
+                child, ecdsa_publickey_from_cache(parent.publickey)):
+            return False
+    return _ecdsa_verify_parsed_certificate_(
+            parsed[-1], _ecdsa_issuer_publickey_(trust_anchor))
+
+def ecdsa_set_certificate_cache_capacity(capacity):
+    _ecdsa_certificate_cache_.set_capacity(capacity)
+
+def ecdsa_certificate_cache_stats():
+    return _ecdsa_certificate_cache_.stats()
+
+def ecdsa_clear_certificate_cache():
+    _ecdsa_certificate_cache_.clear()
+
+
+
+
+
+
+
+
+
+
+#
+# Certificate bundles
+#
+# A bundle is either a concatenation of DER certificates or a PEM file.
+# It is memory-mapped and walked one certificate at a time, so the bundle
+# is never read into memory as a whole.
+#
+
+_PEM_BEGIN_ = b'-----BEGIN CERTIFICATE-----'
+_PEM_END_   = b'-----END CERTIFICATE-----'
+
+def ecdsa_scan_certificate_bundle(path):
+    """
+    yield (offset, spki_sha256, publickey) for every certificate in the
+    bundle at path that carries a secp256r1 public key
+
+    offset is the position of the certificate (or of its PEM block) in the
+    file and spki_sha256 is the SHA-256 digest of the DER encoding of its
+    SubjectPublicKeyInfo.  Other certificates are skipped.
+    """
+    with open(path, 'rb') as stream:
+        yield from _ecdsa_scan_certificate_file_(stream)
+
+def _ecdsa_scan_certificate_file_(stream):
+    # the same as ecdsa_scan_certificate_bundle for an open regular file
+    if stream.seek(0, 2) == 0:
+        return
+    with mmap.mmap(stream.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        yield from _ecdsa_scan_certificate_buffer_(mapped)
+
+def _ecdsa_scan_certificate_buffer_(buffer):
+    # the same as ecdsa_scan_certificate_bundle for a bundle in memory
+    certificates = _ecdsa_iter_bundle_(buffer)
+    try:
+        for offset, certificate in certificates:
+            try:
+                pk_info, publickey = (
+                    _ecdsa_extract_subjectpublickeyinfo_from_certificate_(
+                            certificate))
+            except ecdsa_Error:
+                continue
+            finally:
+                del certificate
+            spki_sha256 = hashlib.sha256(pk_info).digest()
+            del pk_info
+            yield offset, spki_sha256, publickey
+    finally:
+        # views into a mapped buffer must be gone before it is closed
+        certificates.close()
+
+def _ecdsa_iter_bundle_(mapped):
+    # yield (offset, certificate) where certificate is a view into mapped
+    # for DER bundles and a fresh bytes object for PEM bundles
+    start = 0
+    while start < len(mapped) and mapped[start] in b' \t\r\n':
+        start += 1
+    if start < len(mapped) and mapped[start] == 0x30:
+        with memoryview(mapped) as view:
+            offset = start
+            while offset < len(view):
+                try:
+                    _, _, end = _asn1_element_span_(view, offset, len(view))
+                except asn1_Error:
+                    raise ecdsa_Error
+                certificate = view[offset:end]
+                yield offset, certificate
+                certificate.release()
+                offset = end
+    else:
+        yield from _ecdsa_iter_pem_bundle_(mapped)
+
+def _ecdsa_iter_pem_bundle_(mapped):
+    offset = mapped.find(_PEM_BEGIN_)
+    while offset != -1:
+        body = offset + len(_PEM_BEGIN_)
+        end = mapped.find(_PEM_END_, body)
+        if end == -1:
+            raise ecdsa_Error
+        try:
+            certificate = binascii.a2b_base64(mapped[body:end])
+        except binascii.Error:
+            raise ecdsa_Error
+        yield offset, certificate
+        offset = mapped.find(_PEM_BEGIN_, end + len(_PEM_END_))
+
+#
+# SPKI index
+#
+# An open-addressing hash table on disk mapping the SHA-256 digest of a
+# SubjectPublicKeyInfo to the bundle offset of the first certificate that
+# carries it and the public key itself, so a lookup reads one or a few
+# fixed-size records and parses nothing:
+#
+#       header:  magic (8) || capacity (8) || count (8)
+#       record:  spki_sha256 (32) || offset (8) || key length (1) || key (65)
+#
+# A record with key length 0 is an empty slot.
+#
+
+_SPKI_INDEX_MAGIC_  = b'SPKIIDX1'
+_SPKI_INDEX_HEADER_ = 24
+_SPKI_INDEX_RECORD_ = 106
+
+def ecdsa_build_spki_index(bundle_path, index_path):
+    """
+    scan the bundle and write an SPKI index for it; return the number of
+    distinct secp256r1 public keys indexed
+    """
+    directory = os.path.dirname(os.path.abspath(index_path))
+    count = 0
+    with tempfile.TemporaryFile(dir=directory) as spool:
+        for offset, spki_sha256, publickey in \
+                ecdsa_scan_certificate_bundle(bundle_path):
+            spool.write(_ecdsa_spki_index_record_(spki_sha256, offset,
+                                                  publickey))
+            count += 1
+        capacity = 1
+        while capacity < 2 * count:
+            capacity *= 2
+        size = _SPKI_INDEX_HEADER_ + capacity * _SPKI_INDEX_RECORD_
+        distinct = 0
+        with open(index_path, 'w+b') as stream:
+            stream.truncate(size)
+            with mmap.mmap(stream.fileno(), size) as table:
+                spool.seek(0)
+                for _ in range(count):
+                    record = spool.read(_SPKI_INDEX_RECORD_)
+                    slot = _ecdsa_spki_index_find_slot_(table, capacity,
+                                                        record[:32])
+                    position = (_SPKI_INDEX_HEADER_ +
+                                slot * _SPKI_INDEX_RECORD_)
+                    if table[position + 40] == 0:
+                        table[position:position + _SPKI_INDEX_RECORD_] = record
+                        distinct += 1
+                table[:_SPKI_INDEX_HEADER_] = (
+                        _SPKI_INDEX_MAGIC_ +
+                        capacity.to_bytes(length=8, byteorder='big') +
+                        distinct.to_bytes(length=8, byteorder='big'))
+    return distinct
+
+def _ecdsa_spki_index_record_(spki_sha256, offset, publickey):
+    return (spki_sha256 + offset.to_bytes(length=8, byteorder='big') +
+            bytes([len(publickey)]) + publickey.ljust(65, b'\x00'))
+
+def _ecdsa_spki_index_find_slot_(table, capacity, spki_sha256):
+    # the slot holding spki_sha256, or the empty slot where it belongs
+    slot = int.from_bytes(spki_sha256[:8], byteorder='big') & (capacity - 1)
+    while True:
+        position = _SPKI_INDEX_HEADER_ + slot * _SPKI_INDEX_RECORD_
+        if (table[position + 40] == 0 or
+                table[position:position + 32] == spki_sha256):
+            return slot
+        slot = (slot + 1) & (capacity - 1)
+
+class ecdsa_SPKIIndex:
+    """
+    a memory-mapped SPKI index written by ecdsa_build_spki_index
+    """
+
+    def __init__(self, index_path):
+        with open(index_path, 'rb') as stream:
+            self._table_ = mmap.mmap(stream.fileno(), 0,
+                                     access=mmap.ACCESS_READ)
+        header = self._table_[:_SPKI_INDEX_HEADER_]
+        if header[:8] != _SPKI_INDEX_MAGIC_:
+            self._table_.close()
+            raise ecdsa_Error
+        self.capacity = int.from_bytes(header[8:16], byteorder='big')
+        self.count = int.from_bytes(header[16:24], byteorder='big')
+        if len(self._table_) != (_SPKI_INDEX_HEADER_ +
+                                 self.capacity * _SPKI_INDEX_RECORD_):
+            self._table_.close()
+            raise ecdsa_Error
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, spki_sha256):
+        """
+        return (offset, publickey) for this SPKI digest, or None
+        """
+        assert type(spki_sha256) is bytes and len(spki_sha256) == 32
+        slot = _ecdsa_spki_index_find_slot_(self._table_, self.capacity,
+                                            spki_sha256)
+        position = _SPKI_INDEX_HEADER_ + slot * _SPKI_INDEX_RECORD_
+        record = self._table_[position:position + _SPKI_INDEX_RECORD_]
+        if record[40] == 0:
+            return None
+        offset = int.from_bytes(record[32:40], byteorder='big')
+        return offset, record[41:41 + record[40]]
+
+    def lookup_spki(self, subjectpublickeyinfo):
+        return self.lookup(hashlib.sha256(subjectpublickeyinfo).digest())
+
+    def close(self):
+        self._table_.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+
+
+
+
+
+
+
+
+#
+# Instrumentation
+#
+# When enabled, the module functions below are replaced by wrappers that
+# count operations or time stages, and the public entry points time the
+# whole call.  When disabled the original functions are put back, so the
+# only cost left is one flag test per ecdsa_verify_signature and
+# ecdsa_extract_publickey_octetstring_from_certificate call.
+#
+# Field multiplications done inline by the Jacobian formulas are counted
+# from the number of point operations: 8 per doubling, 16 per addition
+# and 11 per mixed addition.  Counters are not synchronized between
+# threads and may miss a few increments under contention.
+#
+
+_instrumentation_enabled_  = False
+_instrumentation_counters_ = dict.fromkeys(
+        ('field_mul', 'field_inv', 'field_sqrt', 'point_add', 'point_dbl'), 0)
+_instrumentation_latency_  = {}
+_instrumentation_originals_ = {}
+
+# latency histogram bucket upper bounds in microseconds
+_INSTRUMENTATION_BOUNDS_US_ = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000,
+                               2000, 5000, 10000, 20000, 50000, 100000,
+                               1000000, float('inf'))
+
+def _instrumentation_wrappers_():
+    def counting(function, counter, field_muls):
+        counters = _instrumentation_counters_
+        def wrapper(*args, **kwargs):
+            counters[counter] += 1
+            counters['field_mul'] += field_muls
+            return function(*args, **kwargs)
+        return wrapper
+    def counting_batch_inv(function):
+        counters = _instrumentation_counters_
+        def wrapper(values, modulus, error):
+            counters['field_mul'] += 3 * max(len(values) - 1, 0)
+            return function(values, modulus, error)
+        return wrapper
+    def timing(function, stage):
+        def wrapper(*args, **kwargs):
+            with _instrumentation_timer_(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    g = globals()
+    return {
+        '_ej_dbl_':         counting(g['_ej_dbl_'], 'point_dbl', 8),
+        '_ej_add_':         counting(g['_ej_add_'], 'point_add', 16),
+        '_ej_add_affine_':  counting(g['_ej_add_affine_'], 'point_add', 11),
+        '_inv_mod_':        counting(g['_inv_mod_'], 'field_inv', 0),
+        '_batch_inv_':      counting_batch_inv(g['_batch_inv_']),
+        'fp_mul':           counting(g['fp_mul'], 'field_mul', 0),
+        'fq_mul':           counting(g['fq_mul'], 'field_mul', 0),
+        'fp_sqrt':          counting(g['fp_sqrt'], 'field_sqrt', 0),
+        'ecdsa_publickey_from_cache':
+            timing(g['ecdsa_publickey_from_cache'], 'verify.publickey'),
+        '_ecdsa_signature_base_octetstring_to_integer_mod_q_':
+            timing(g['_ecdsa_signature_base_octetstring_to_integer_mod_q_'],
+                   'verify.hash'),
+        '_asn1_parse_a_sequence_of_two_signed_integers_':
+            timing(g['_asn1_parse_a_sequence_of_two_signed_integers_'],
+                   'verify.signature_parse'),
+        '_ecdsa_is_valid_Qhrs_quadruple_':
+            timing(g['_ecdsa_is_valid_Qhrs_quadruple_'],
+                   'verify.arithmetic'),
+        '_ecdsa_ensure_good_ecdsa_publickey_':
+            timing(g['_ecdsa_ensure_good_ecdsa_publickey_'],
+                   'certificate.publickey_validation'),
+    }
+
+def instrumentation_enable():
+    global _instrumentation_enabled_
+    if _instrumentation_enabled_:
+        return
+    g = globals()
+    for name, wrapper in _instrumentation_wrappers_().items():
+        _instrumentation_originals_[name] = g[name]
+        g[name] = wrapper
+    _instrumentation_enabled_ = True
+
+def instrumentation_disable():
+    global _instrumentation_enabled_
+    if not _instrumentation_enabled_:
+        return
+    globals().update(_instrumentation_originals_)
+    _instrumentation_originals_.clear()
+    _instrumentation_enabled_ = False
+
+def instrumentation_is_enabled():
+    return _instrumentation_enabled_
+
+def instrumentation_reset():
+    for name in _instrumentation_counters_:
+        _instrumentation_counters_[name] = 0
+    _instrumentation_latency_.clear()
+
+def instrumentation_snapshot():
+    """
+    return {'counters': {name: count},
+            'latency': {stage: {'count', 'total_us', 'buckets'}}}
+
+    buckets is a list of [upper bound in microseconds, count] pairs.
+    """
+    return {
+        'counters': dict(_instrumentation_counters_),
+        'latency': {
+            stage: {
+                'count':    histogram[0],
+                'total_us': histogram[1],
+                'buckets':  [[bound, count] for bound, count in
+                             zip(_INSTRUMENTATION_BOUNDS_US_, histogram[2])],
+            }
+            for stage, histogram in _instrumentation_latency_.items()
+        },
+    }
+
+@contextlib.contextmanager
+def _instrumentation_timer_(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = (time.perf_counter() - start) * 1e6
+        histogram = _instrumentation_latency_.get(stage)
+        if histogram is None:
+            histogram = [0, 0.0, [0] * len(_INSTRUMENTATION_BOUNDS_US_)]
+            _instrumentation_latency_[stage] = histogram
+        histogram[0] += 1
+        histogram[1] += elapsed
+        for i, bound in enumerate(_INSTRUMENTATION_BOUNDS_US_):
+            if elapsed <= bound:
+                histogram[2][i] += 1
+                break
+
+@contextlib.contextmanager
+def instrumentation_profile():
+    """
+    enable instrumentation for a block and collect what happened in it
+
+        with secp256r1.instrumentation_profile() as profile:
+            secp256r1.ecdsa_verify_signature(publickey, message, signature)
+        profile['counters']['point_dbl']
+    """
+    was_enabled = _instrumentation_enabled_
+    before = instrumentation_snapshot()
+    profile = {}
+    instrumentation_enable()
+    try:
+        yield profile
+    finally:
+        if not was_enabled:
+            instrumentation_disable()
+        profile.update(_instrumentation_difference_(
+                instrumentation_snapshot(), before))
+
+def _instrumentation_difference_(after, before):
+    latency = {}
+    for stage, histogram in after['latency'].items():
+        earlier = before['latency'].get(stage)
+        if earlier is None:
+            latency[stage] = histogram
+            continue
+        if histogram['count'] == earlier['count']:
+            continue
+        latency[stage] = {
+            'count':    histogram['count'] - earlier['count'],
+            'total_us': histogram['total_us'] - earlier['total_us'],
+            'buckets':  [[bound, count - earlier_count]
+                         for (bound, count), (_, earlier_count) in
+                         zip(histogram['buckets'], earlier['buckets'])],
+        }
+    return {
+        'counters': {name: after['counters'][name] - before['counters'][name]
+                     for name in after['counters']},
+        'latency': latency,
+    }
+
+
+
+
+
+
+
+
+
+
+#
+# Command line interface
+#
+#       python -m secp256r1 verify [RECORDS]
+#       python -m secp256r1 extract [BUNDLE]
+#       python -m secp256r1 convert {compress,decompress} [KEYS]
+#
+# Inputs default to stdin and outputs to stdout, and records are handled
+# in chunks, so a job can run in a shell pipeline on inputs of any size.
+# With --workers N the chunks go to N processes, with a bounded number in
+# flight, and results are still written in input order.  extract needs
+# the whole bundle at once, so it spools stdin to a temporary file and
+# maps that instead of reading it into memory.  A summary goes to stderr;
+# the exit status is 1 if any record failed.  A closed output pipe (as
+# with | head) ends the job quietly with status 1.
+#
+
+def _cli_main_(argv=None):
+    parser = argparse.ArgumentParser(
+            prog='python -m secp256r1',
+            description='bulk secp256r1 ECDSA verification and key tools')
+    parser.add_argument('--summary', choices=('text', 'json'),
+                        default='text', help='summary format on stderr')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    verify = commands.add_parser(
+            'verify', help='verify (publickey, message, signature) records')
+    verify.add_argument('input', nargs='?', default='-',
+                        help='record file, - for stdin')
+    verify.add_argument('-o', '--output', default='-',
+                        help='JSON lines of results, - for stdout')
+    verify.add_argument('-f', '--format', default='jsonl',
+                        choices=('jsonl', 'length-prefixed'))
+    verify.add_argument('--failures-only', action='store_true',
+                        help='only write records that did not verify')
+    verify.add_argument('--workers', type=int, default=1)
+    verify.add_argument('--chunksize', type=int, default=256)
+
+    extract = commands.add_parser(
+            'extract', help='extract public keys from a certificate bundle')
+    extract.add_argument('input', nargs='?', default='-',
+                         help='DER or PEM bundle, - for stdin')
+    extract.add_argument('-o', '--output', default='-',
+                         help='JSON lines of keys, - for stdout')
+    extract.add_argument('--compressed', action='store_true')
+
+    convert = commands.add_parser(
+            'convert', help='compress or decompress public keys in bulk')
+    convert.add_argument('direction', choices=('compress', 'decompress'))
+    convert.add_argument('input', nargs='?', default='-',
+                         help='key file, - for stdin')
+    convert.add_argument('-o', '--output', default='-',
+                         help='key file, - for stdout')
+    convert.add_argument('--input-format', choices=('raw', 'hex'),
+                         default='raw',
+                         help='fixed-width binary records or one hex key '
+                              'per line')
+    convert.add_argument('--output-format', choices=('raw', 'hex'),
+                         default='raw')
+    convert.add_argument('--workers', type=int, default=1)
+    convert.add_argument('--chunksize', type=int, default=4096)
+
+    args = parser.parse_args(argv)
+    if getattr(args, 'workers', 1) < 1 or getattr(args, 'chunksize', 1) < 1:
+        parser.error('--workers and --chunksize must be at least 1')
+    command = {'verify':  _cli_verify_,
+               'extract': _cli_extract_,
+               'convert': _cli_convert_}[args.command]
+    try:
+        summary = command(args)
+    except ecdsa_Error:
+        parser.exit(2, '{}: malformed input\n'.format(parser.prog))
+    except BrokenPipeError:
+        # stdout is pointed at devnull so that flushing it at exit does
+        # not fail again
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return 1
+    _cli_print_summary_(summary, args.summary)
+    return 1 if summary['failures'] else 0
+
+@contextlib.contextmanager
+def _cli_open_(name, mode):
+    if name == '-':
+        stream = sys.stdin.buffer if 'r' in mode else sys.stdout.buffer
+        yield stream
+        if 'w' in mode:
+            stream.flush()
+    else:
+        with open(name, mode) as stream:
+            yield stream
+
+def _cli_map_(function, arguments, workers):
+    if workers == 1:
+        return (function(*args) for args in arguments)
+    return _ecdsa_pool_map_(function, arguments, workers)
+
+def _cli_chunks_(iterable, chunksize):
+    iterator = iter(iterable)
+    while True:
+        chunk = tuple(itertools.islice(iterator, chunksize))
+        if not chunk:
+            return
+        yield (chunk,)
+
+def _cli_verify_(args):
+    decode = {'jsonl':           ecdsa_decode_jsonl_records,
+              'length-prefixed': ecdsa_decode_length_prefixed_records,
+              }[args.format]
+    counts = {'valid': 0, 'invalid': 0, 'malformed': 0}
+    latency = _cli_Histogram_()
+    index = 0
+    start = time.perf_counter()
+    with _cli_open_(args.input, 'rb') as source, \
+            _cli_open_(args.output, 'wb') as sink:
+        chunks = _cli_chunks_(decode(source), args.chunksize)
+        for results in _cli_map_(_cli_verify_chunk_, chunks, args.workers):
+            for valid, seconds in results:
+                counts['valid' if valid else
+                       'invalid' if valid is False else 'malformed'] += 1
+                latency.add(seconds)
+                if not (args.failures_only and valid):
+                    sink.write(json.dumps({'index': index, 'valid': valid})
+                               .encode() + b'\n')
+                index += 1
+    elapsed = time.perf_counter() - start
+    return dict(_cli_rate_('verify', index, elapsed), **counts,
+                failures=counts['invalid'] + counts['malformed'],
+                latency_us=latency.percentiles())
+
+def _cli_verify_chunk_(records):
+    # [(True / False / None for a malformed record, seconds)]
+    results = []
+    for record in records:
+        start = time.perf_counter()
+        valid = None
+        if record is not None:
+            try:
+                valid = ecdsa_verify_signature(*record)
+            except ecdsa_Error:
+                pass
+        results.append((valid, time.perf_counter() - start))
+    return results
+
+def _cli_extract_(args):
+    count = 0
+    start = time.perf_counter()
+    with contextlib.ExitStack() as stack:
+        sink = stack.enter_context(_cli_open_(args.output, 'wb'))
+        if args.input == '-':
+            spool = stack.enter_context(tempfile.TemporaryFile())
+            with _cli_open_('-', 'rb') as source:
+                shutil.copyfileobj(source, spool, 1 << 20)
+            keys = _ecdsa_scan_certificate_file_(spool)
+        else:
+            keys = ecdsa_scan_certificate_bundle(args.input)
+        # the mapping is released before the spool file is closed
+        stack.callback(keys.close)
+        for offset, spki_sha256, publickey in keys:
+            if args.compressed:
+                publickey = ecdsa_compress_publickey(publickey)
+            sink.write(json.dumps({'offset':      offset,
+                                   'spki_sha256': spki_sha256.hex(),
+                                   'publickey':   publickey.hex()})
+                       .encode() + b'\n')
+            count += 1
+    return dict(_cli_rate_('extract', count, time.perf_counter() - start),
+                failures=0)
+
+def _cli_convert_(args):
+    compress = args.direction == 'compress'
+    in_width, out_width = (65, 33) if compress else (33, 65)
+    count = 0
+    invalid = []
+    start = time.perf_counter()
+    with _cli_open_(args.input, 'rb') as source, \
+            _cli_open_(args.output, 'wb') as sink:
+        if args.input_format == 'raw':
+            chunks = ((chunk, in_width, out_width) for chunk in
+                      iter(lambda: _cli_read_raw_chunk_(
+                              source, args.chunksize * in_width, in_width),
+                           b''))
+        else:
+            chunks = ((tuple(_cli_hex_key_(line) for line in lines),
+                       in_width, out_width)
+                      for (lines,) in _cli_chunks_(source, args.chunksize))
+        for records, chunk_invalid in _cli_map_(
+                _ecdsa_convert_publickey_chunk_, chunks, args.workers):
+            invalid.extend(count + i for i in chunk_invalid)
+            n = len(records) // out_width
+            if args.output_format == 'raw':
+                sink.write(records)
+            else:
+                bad = set(chunk_invalid)
+                sink.write(b''.join(
+                        (b'' if i in bad else
+                         records[i * out_width:(i + 1) * out_width]
+                         .hex().encode()) + b'\n' for i in range(n)))
+            count += n
+    return dict(_cli_rate_('convert', count, time.perf_counter() - start),
+                invalid=len(invalid), failures=len(invalid),
+                first_invalid=list(itertools.islice(invalid, 10)))
+
+def _cli_read_raw_chunk_(stream, size, width):
+    data = stream.read(size)
+    while 0 < len(data) < size:
+        more = stream.read(size - len(data))
+        if not more:
+            break
+        data += more
+    if len(data) % width != 0:
+        raise ecdsa_Error
+    return data
+
+def _cli_hex_key_(line):
+    # an undecodable line becomes an empty, hence invalid, key
+    try:
+        return bytes.fromhex(line.decode('ascii').strip())
+    except ValueError:
+        return b''
+
+def _cli_rate_(command, records, elapsed):
+    return {'command':            command,
+            'records':            records,
+            'elapsed_s':          round(elapsed, 6),
+            'records_per_second': round(records / elapsed, 1)
+                                  if elapsed else 0.0}
+
+class _cli_Histogram_:
+    """
+    log-scale latency histogram with buckets about 6% wide, so that
+    percentiles of any number of records take constant memory
+    """
+
+    _SCALE_ = 16
+
+    def __init__(self):
+        self.buckets = collections.Counter()
+        self.count = 0
+        self.maximum = 0.0
+
+    def add(self, seconds):
+        us = max(seconds * 1e6, 0.01)
+        self.buckets[math.floor(math.log(us) * self._SCALE_)] += 1
+        self.count += 1
+        self.maximum = max(self.maximum, us)
+
+    def percentiles(self):
+        if self.count == 0:
+            return {}
+        result = {}
+        wanted = [(50, 'p50'), (90, 'p90'), (99, 'p99')]
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            while wanted and seen >= self.count * wanted[0][0] / 100:
+                # report the upper edge of the bucket
+                result[wanted.pop(0)[1]] = round(
+                        min(math.exp((bucket + 1) / self._SCALE_),
+                            self.maximum), 1)
+        result['max'] = round(self.maximum, 1)
+        return result
+
+def _cli_print_summary_(summary, style):
+    if style == 'json':
+        print(json.dumps(summary, sort_keys=True), file=sys.stderr)
+        return
+    for name, value in summary.items():
+        if isinstance(value, dict):
+            value = '  '.join('{} {}'.format(k, v) for k, v in value.items())
+        print('{:20} {}'.format(name + ':', value), file=sys.stderr)
+
+if __name__ == '__main__':
+    sys.exit(_cli_main_())
@@ -0,0 +1,126 @@
+#
+# Accepted and rejected DER encodings, pinning the behaviour of the
+# offset-based parser to that of the original one
+#
+#       python -m pytest test_asn1.py
+#
+
+import pytest
+
+import secp256r1
+
+Error = secp256r1.asn1_Error
+
+def h(text):
+    return bytes.fromhex(text.replace(' ', ''))
+
+LONG_127 = '01' + '00' * 127
+LONG_255 = '01' + '00' * 255
+
+INTEGERS = [
+    ('02 01 00',                    0),
+    ('02 01 7f',                    127),
+    ('02 02 00 80',                 128),
+    ('02 01 80',                    -128),
+    ('02 02 ff 7f',                 -129),
+    # accepted by the original parser too, which only checked for a
+    # redundant leading 0x00
+    ('02 00',                       0),
+    ('02 02 ff 80',                 -128),
+    ('02 81 80 ' + LONG_127,        1 << (8 * 127)),
+    ('02 82 01 00 ' + LONG_255,     1 << (8 * 255)),
+    ('02 02 00 7f',                 Error),     # redundant leading 0x00
+    ('02 02 00 00',                 Error),
+    ('03 01 00',                    Error),     # not an INTEGER
+    ('02 01 00 00',                 Error),     # trailing octets
+    ('02 01',                       Error),     # V too short
+    ('02 03 00 01',                 Error),
+    ('02',                          Error),     # no L
+    ('',                            Error),
+    ('02 80 01 00 00',              Error),     # indefinite length
+    ('02 81 01 01',                 Error),     # 0x81 for a short length
+    ('02 81 7f ' + '01' * 127,      Error),
+    ('02 82 00 80 ' + LONG_127,     Error),     # leading zero in L
+    ('02 82 00 01 01',              Error),
+    ('02 83 00 00 01 01',           Error),
+    ('02 81',                       Error),     # L cut short
+    ('02 82 01',                    Error),
+    ('02 84 ff ff ff ff 00',        Error),     # V far too short
+]
+
+BITSTRINGS = [
+    ('03 01 00',                    b''),
+    ('03 02 00 01',                 b'\x01'),
+    ('03 03 00 ff 00',              b'\xff\x00'),
+    # the original parser failed with IndexError here
+    ('03 00',                       Error),
+    ('03 02 01 01',                 Error),     # unused bits
+    ('03 02 00',                    Error),
+    ('03 01 00 00',                 Error),
+    ('04 01 00',                    Error),
+]
+
+SEQUENCES = [
+    ('30 00',                       ()),
+    ('30 06 02 01 01 02 01 02',     (h('02 01 01'), h('02 01 02'))),
+    ('30 05 30 03 02 01 01',        (h('30 03 02 01 01'),)),
+    ('30 81 80 04 7e ' + '00' * 126,
+                                    (h('04 7e ' + '00' * 126),)),
+    ('30 03 02 01 01 00',           Error),     # trailing octets
+    ('30 04 02 01 01',              Error),     # V too short
+    ('30 03 02 02 01',              Error),     # element runs past V
+    ('30 04 02 01 01 02',           Error),     # element without L
+    ('30 80 02 01 01 00 00',        Error),     # indefinite length
+    ('30 81 03 02 01 01',           Error),     # 0x81 for a short length
+    ('30 82 00 03 02 01 01',        Error),     # leading zero in L
+    ('31 00',                       Error),     # SET, not SEQUENCE
+]
+
+SIGNATURES = [
+    ('30 06 02 01 01 02 01 02',     (1, 2)),
+    ('30 08 02 02 00 80 02 02 ff 7f',
+                                    (128, -129)),
+    ('30 03 02 01 01',              Error),
+    ('30 09 02 01 01 02 01 02 02 01 03',
+                                    Error),
+    ('30 06 02 01 01 04 01 02',     Error),
+    ('30 07 02 02 00 01 02 01 02',  Error),
+    ('30 06 02 01 01 02 01 02 00',  Error),
+]
+
+def check(function, encoding, expected):
+    if expected is Error:
+        with pytest.raises(Error):
+            function(h(encoding))
+    else:
+        assert function(h(encoding)) == expected
+
+@pytest.mark.parametrize('encoding, expected', INTEGERS)
+def test_integer(encoding, expected):
+    check(secp256r1.asn1_parse_integer, encoding, expected)
+
+@pytest.mark.parametrize('encoding, expected', BITSTRINGS)
+def test_bitstring(encoding, expected):
+    check(secp256r1.asn1_parse_bitstring_as_octet_string, encoding, expected)
+
+@pytest.mark.parametrize('encoding, expected', SEQUENCES)
+def test_sequence(encoding, expected):
+    check(secp256r1.asn1_parse_sequence, encoding, expected)
+
+@pytest.mark.parametrize('encoding, expected', SIGNATURES)
+def test_signature(encoding, expected):
+    check(secp256r1._asn1_parse_a_sequence_of_two_signed_integers_,
+          encoding, expected)
+
+@pytest.mark.parametrize('kind', [bytes, bytearray, memoryview])
+def test_buffer_types(kind):
+    encoding = h('30 06 02 01 01 02 01 02')
+    assert secp256r1.asn1_parse_sequence(kind(encoding)) == (
+            h('02 01 01'), h('02 01 02'))
+    assert secp256r1.asn1_parse_integer(kind(h('02 01 80'))) == -128
+
+def test_iter_sequence_views():
+    encoding = h('30 06 02 01 01 02 01 02')
+    views = list(secp256r1.asn1_iter_sequence(encoding))
+    assert all(isinstance(view, memoryview) for view in views)
+    assert [bytes(view) for view in views] == [h('02 01 01'), h('02 01 02')]
@@ -0,0 +1,104 @@
+#
+# Certificate signatures and chains on a generated root -> intermediate ->
+# leaf hierarchy
+#
+#       python -m pytest test_certificates.py
+#
+
+import pytest
+
+import secp256r1
+
+def test_certificate_signature(pki):
+    verify = secp256r1.ecdsa_verify_certificate_signature
+    assert verify(pki['root'], pki['root'])
+    assert verify(pki['inter'], pki['root'])
+    assert verify(pki['inter'], pki['root_key'])
+    assert verify(pki['inter'],
+                  secp256r1.ecdsa_PublicKey(pki['root_key']))
+    assert verify(pki['leaf'], pki['inter'])
+    assert not verify(pki['leaf'], pki['root'])
+    assert not verify(pki['inter'], pki['inter'])
+
+def test_chain_anchored_by_certificate_or_key(pki):
+    verify = secp256r1.ecdsa_verify_certificate_chain
+    assert verify([pki['leaf'], pki['inter'], pki['root']], pki['root'])
+    assert verify([pki['leaf'], pki['inter']], pki['root'])
+    assert verify([pki['leaf'], pki['inter']], pki['root_key'])
+    assert verify([pki['leaf'], pki['inter']],
+                  secp256r1.ecdsa_PublicKey(pki['root_key']))
+    assert verify([pki['inter']], pki['root'])
+
+def test_chain_wrong_anchor(pki):
+    verify = secp256r1.ecdsa_verify_certificate_chain
+    assert not verify([pki['leaf'], pki['inter']], pki['inter'])
+    assert not verify([pki['leaf'], pki['inter']], pki['fake_root'])
+    assert not verify([pki['leaf'], pki['root']], pki['root'])
+
+def test_chain_ending_self_signed_needs_the_anchor(pki):
+    verify = secp256r1.ecdsa_verify_certificate_chain
+    chain = [pki['leaf'], pki['inter'], pki['fake_root']]
+    assert not verify(chain, pki['root'])
+    with pytest.raises(TypeError):
+        verify(chain)
+
+def test_chain_name_mismatch(pki):
+    # the signature is good, but the leaf names another issuer
+    assert secp256r1.ecdsa_verify_certificate_signature(pki['misnamed'],
+                                                        pki['inter'])
+    assert not secp256r1.ecdsa_verify_certificate_chain(
+            [pki['misnamed'], pki['inter']], pki['root'])
+
+def test_chain_intermediate_signed_by_wrong_key(pki):
+    assert not secp256r1.ecdsa_verify_certificate_chain(
+            [pki['leaf'], pki['wrong_key']], pki['root'])
+    assert not secp256r1.ecdsa_verify_certificate_chain(
+            [pki['leaf'], pki['wrong_key'], pki['root']], pki['root'])
+
+def test_tampered_tbs_certificate(pki):
+    tampered = pki['leaf'].replace(b'leaf', b'lexf')
+    assert tampered != pki['leaf']
+    assert not secp256r1.ecdsa_verify_certificate_signature(tampered,
+                                                            pki['inter'])
+    assert not secp256r1.ecdsa_verify_certificate_chain(
+            [tampered, pki['inter']], pki['root'])
+
+def test_v1_certificate(pki):
+    assert bytes.fromhex('a003020102') not in pki['v1_leaf']
+    assert secp256r1.ecdsa_verify_certificate_chain(
+            [pki['v1_leaf'], pki['inter']], pki['root'])
+
+def test_other_signature_algorithm(pki):
+    assert not secp256r1.ecdsa_verify_certificate_signature(pki['sha384'],
+                                                            pki['inter'])
+    assert not secp256r1.ecdsa_verify_certificate_chain(
+            [pki['sha384'], pki['inter']], pki['root'])
+
+@pytest.mark.parametrize('malformed', [
+    b'',
+    b'\x30\x00',
+    b'\x30\x03\x02\x01\x01',
+    b'\x04\x00',
+])
+def test_unparsable_certificate(pki, malformed):
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_verify_certificate_signature(malformed, pki['inter'])
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_verify_certificate_chain([malformed, pki['inter']],
+                                                 pki['root'])
+
+def test_unparsable_certificate_truncated(pki):
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_verify_certificate_signature(pki['leaf'][:-1],
+                                                     pki['inter'])
+
+def test_unparsable_issuer(pki):
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_verify_certificate_signature(pki['leaf'],
+                                                     b'\x04' + bytes(64))
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_verify_certificate_chain([pki['leaf']], b'\x30\x00')
+
+def test_empty_chain(pki):
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_verify_certificate_chain([], pki['root'])
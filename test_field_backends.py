@@ -0,0 +1,72 @@
+#
+# Every available field backend against the builtin arithmetic and the
+# reference point multiplication
+#
+#       python -m pytest test_field_backends.py
+#
+
+import random
+
+import pytest
+
+import secp256r1
+from secp256r1 import p, q
+
+BACKENDS = secp256r1.field_backends_available()
+
+@pytest.fixture(params=BACKENDS)
+def backend(request):
+    previous = secp256r1.get_field_backend()
+    secp256r1.set_field_backend(request.param)
+    try:
+        yield request.param
+    finally:
+        secp256r1.set_field_backend(previous)
+
+def values(rng, modulus):
+    return [1, 2, modulus - 1] + [rng.randrange(1, modulus) for _ in range(16)]
+
+@pytest.mark.parametrize('modulus', (p, q))
+def test_inv_mod(backend, modulus):
+    rng = random.Random(modulus)
+    integer = secp256r1._field_int_
+    for value in values(rng, modulus):
+        inverse = secp256r1._inv_mod_(integer(value), integer(modulus))
+        assert int(inverse) == pow(value, modulus - 2, modulus)
+
+@pytest.mark.parametrize('modulus', (p, q))
+def test_pow_mod(backend, modulus):
+    rng = random.Random(modulus)
+    integer = secp256r1._field_int_
+    for value in values(rng, modulus):
+        exponent = rng.randrange(modulus)
+        power = secp256r1._pow_mod_(integer(value), exponent, integer(modulus))
+        assert int(power) == pow(value, exponent, modulus)
+
+def test_e_mul(backend):
+    rng = random.Random(1)
+    G = secp256r1.e(1)
+    for _ in range(4):
+        P = secp256r1._e_mul_reference_(G, secp256r1.fq(rng.randrange(1, q)))
+        k1 = secp256r1.fq(rng.randrange(q))
+        k2 = secp256r1.fq(rng.randrange(q))
+        assert secp256r1.e_eq(secp256r1.e_mul(P, k1),
+                              secp256r1._e_mul_reference_(P, k1))
+        assert secp256r1.e_eq(secp256r1.e_mul(G, k1),
+                              secp256r1._e_mul_reference_(G, k1))
+        assert secp256r1.e_eq(secp256r1.e_mul2(G, k1, P, k2),
+                              secp256r1.e_add(
+                                      secp256r1._e_mul_reference_(G, k1),
+                                      secp256r1._e_mul_reference_(P, k2)))
+
+def test_fp_sqrt(backend):
+    rng = random.Random(2)
+    for _ in range(8):
+        w = secp256r1.fp_square(secp256r1.fp(rng.randrange(1, p)))
+        assert secp256r1.fp_eq(secp256r1.fp_square(secp256r1.fp_sqrt(w)), w)
+
+def test_unknown_backend():
+    previous = secp256r1.get_field_backend()
+    with pytest.raises(secp256r1.field_Error):
+        secp256r1.set_field_backend('no such backend')
+    assert secp256r1.get_field_backend() == previous
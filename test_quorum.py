@@ -0,0 +1,86 @@
+#
+# ecdsa_verify_quorum against ecdsa_verify_signature
+#
+#       python -m pytest test_quorum.py
+#
+
+import random
+
+import pytest
+
+import secp256r1
+
+from benchmark import sign
+
+def reference_quorum(single, message, signers):
+    # the indexes ecdsa_verify_signature accepts, a key counting once
+    points, passed = set(), []
+    for index, (publickey, signature) in enumerate(signers):
+        if not single(publickey, message, signature):
+            continue
+        point = secp256r1.ecdsa_publickey_from_cache(publickey).point
+        if point not in points:
+            points.add(point)
+            passed.append(index)
+    return passed
+
+@pytest.fixture(scope='module')
+def quorum_signers(keys):
+    rng = random.Random(9)
+    message = b'quorum'
+    return message, [(publickey, sign(rng, d, message))
+                     for d, publickey in keys]
+
+def test_quorum_valid(quorum_signers):
+    message, signers = quorum_signers
+    for threshold in range(len(signers) + 1):
+        reached, passed = secp256r1.ecdsa_verify_quorum(message, signers,
+                                                        threshold)
+        assert reached
+        assert passed == tuple(range(threshold))
+    assert secp256r1.ecdsa_verify_quorum(
+            message, signers, len(signers) + 1) == (False, ())
+
+def test_quorum_repeated_key(quorum_signers):
+    message, signers = quorum_signers
+    (key1, good1), (key2, good2) = signers[:2]
+    assert secp256r1.ecdsa_verify_quorum(
+            message, [(key1, good2), (key1, good1), (key2, good2)], 2) == (
+            True, (1, 2))
+    assert secp256r1.ecdsa_verify_quorum(
+            message, [(key1, b'\x30\x00'), (key1, good1), (key2, good2)],
+            2) == (True, (1, 2))
+    assert secp256r1.ecdsa_verify_quorum(
+            message, [(key1, good1), (key1, good1), (key2, good1)], 2) == (
+            False, (0,))
+    compressed = secp256r1.ecdsa_compress_publickey(key1)
+    assert secp256r1.ecdsa_verify_quorum(
+            message, [(key1, good1), (compressed, good1)], 2)[0] is False
+
+def test_quorum_matches_single(quorum_signers, single):
+    message, signers = quorum_signers
+    rng = random.Random(10)
+    for _ in range(30):
+        mixed = list(signers)
+        for _ in range(rng.randrange(5)):
+            i = rng.randrange(len(mixed))
+            publickey, signature = mixed[i]
+            kind = rng.randrange(4)
+            if kind == 0:
+                mixed[i] = (publickey, signature[:-1] +
+                            bytes([signature[-1] ^ 1]))
+            elif kind == 1:
+                mixed[i] = (b'\x04' + bytes(64), signature)
+            elif kind == 2:
+                mixed.insert(i, rng.choice(signers))
+            else:
+                mixed.insert(i, (publickey, rng.choice(signers)[1]))
+        rng.shuffle(mixed)
+        expected = reference_quorum(single, message, mixed)
+        for threshold in range(len(signers) + 2):
+            reached, passed = secp256r1.ecdsa_verify_quorum(message, mixed,
+                                                            threshold)
+            assert reached == (len(expected) >= threshold)
+            assert set(passed) <= set(expected)
+            if reached:
+                assert len(passed) == threshold
@@ -0,0 +1,45 @@
+#
+# The verification result cache against ecdsa_verify_signature
+#
+#       python -m pytest test_result_cache.py
+#
+
+import pytest
+
+import secp256r1
+from secp256r1 import q
+
+from benchmark import der_signature
+
+@pytest.fixture
+def result_cache():
+    secp256r1.ecdsa_enable_result_cache(capacity=64)
+    try:
+        yield
+    finally:
+        secp256r1.ecdsa_disable_result_cache()
+
+def test_result_cache_matches_single(mixed_items, single, result_cache):
+    for _ in range(2):
+        for item, expected in mixed_items:
+            assert single(*item) == expected
+    stats = secp256r1.ecdsa_result_cache_stats()
+    assert stats['enabled']
+    assert stats['valid_hits'] > 0 and stats['invalid_hits'] > 0
+
+def test_result_cache_does_not_confuse_messages_or_keys(keys, items,
+                                                        result_cache):
+    publickey, message, signature = items[0]
+    assert secp256r1.ecdsa_verify_signature(publickey, message, signature)
+    assert not secp256r1.ecdsa_verify_signature(publickey, message + b'!',
+                                                signature)
+    assert not secp256r1.ecdsa_verify_signature(keys[1][1], message,
+                                                signature)
+    r, s = secp256r1._asn1_parse_a_sequence_of_two_signed_integers_(signature)
+    # (r, q - s) shares the entry of (r, s) and is equally valid
+    hits = secp256r1.ecdsa_result_cache_stats()['valid_hits']
+    assert secp256r1.ecdsa_verify_signature(publickey, message,
+                                            der_signature(r, q - s))
+    assert secp256r1.ecdsa_result_cache_stats()['valid_hits'] == hits + 1
+    assert not secp256r1.ecdsa_verify_signature(publickey, message,
+                                                der_signature(r, s + 1))
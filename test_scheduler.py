@@ -0,0 +1,100 @@
+#
+# The micro-batching verification scheduler
+#
+#       python -m pytest test_scheduler.py
+#
+
+import asyncio
+import time
+
+import pytest
+
+import secp256r1
+
+def outcome(future):
+    try:
+        return future.result(timeout=30)
+    except secp256r1.ecdsa_Error:
+        return secp256r1.ecdsa_Error
+
+def expected(item):
+    try:
+        return secp256r1.ecdsa_verify_signature(*item)
+    except secp256r1.ecdsa_Error:
+        return secp256r1.ecdsa_Error
+
+def test_results_match_verify_signature(mixed_items):
+    items = [item for item, _ in mixed_items]
+    with secp256r1.ecdsa_VerificationScheduler(max_batch_size=8) as scheduler:
+        futures = [scheduler.submit(*item) for item in items]
+        assert [outcome(future) for future in futures] == [
+                expected(item) for item in items]
+        assert scheduler.verify(*items[0])
+        assert scheduler.stats()['requests'] == len(items) + 1
+
+def test_averify(items):
+    publickey, message, signature = items[0]
+    async def main(scheduler):
+        return await asyncio.gather(
+                scheduler.averify(publickey, message, signature),
+                scheduler.averify(publickey, message + b'!', signature))
+    with secp256r1.ecdsa_VerificationScheduler() as scheduler:
+        assert asyncio.run(main(scheduler)) == [True, False]
+
+def test_batch_closes_at_max_batch_size(items):
+    # with a long max_wait only full batches can start early
+    with secp256r1.ecdsa_VerificationScheduler(
+            max_batch_size=4, max_wait=60) as scheduler:
+        start = time.monotonic()
+        futures = [scheduler.submit(*item) for item in items[:8]]
+        assert all(outcome(future) is True for future in futures)
+        assert time.monotonic() - start < 30
+        stats = scheduler.stats()
+        assert stats['batches'] == 2 and stats['requests'] == 8
+
+def test_batch_closes_at_max_wait(items):
+    with secp256r1.ecdsa_VerificationScheduler(
+            max_batch_size=32, max_wait=0.2) as scheduler:
+        start = time.monotonic()
+        futures = [scheduler.submit(*item) for item in items[:3]]
+        assert all(outcome(future) is True for future in futures)
+        assert time.monotonic() - start >= 0.2
+        stats = scheduler.stats()
+        assert stats['batches'] == 1 and stats['requests'] == 3
+
+def test_cancelled_future_is_dropped(items):
+    with secp256r1.ecdsa_VerificationScheduler(
+            max_batch_size=4, max_wait=60) as scheduler:
+        futures = [scheduler.submit(*item) for item in items[:3]]
+        assert futures[1].cancel()
+        futures.append(scheduler.submit(*items[3]))
+        assert [outcome(futures[i]) for i in (0, 2, 3)] == [True] * 3
+        assert futures[1].cancelled()
+        assert scheduler.stats()['requests'] == 3
+
+def test_overload_at_max_queued(items):
+    scheduler = secp256r1.ecdsa_VerificationScheduler(
+            max_batch_size=32, max_wait=60, max_queued=2)
+    try:
+        futures = [scheduler.submit(*item) for item in items[:2]]
+        with pytest.raises(secp256r1.ecdsa_OverloadError):
+            scheduler.submit(*items[2])
+        assert scheduler.stats()['queued'] == 2
+    finally:
+        scheduler.close()
+    assert [outcome(future) for future in futures] == [True, True]
+
+def test_close_drains_the_queue(items):
+    scheduler = secp256r1.ecdsa_VerificationScheduler(
+            max_batch_size=32, max_wait=60)
+    publickey, message, signature = items[0]
+    futures = [scheduler.submit(*item) for item in items[:5]]
+    futures.append(scheduler.submit(publickey, message + b'!', signature))
+    futures.append(scheduler.submit(publickey, message, b'\x30\x00'))
+    scheduler.close()
+    assert all(future.done() for future in futures)
+    assert [outcome(future) for future in futures] == (
+            [True] * 5 + [False, secp256r1.ecdsa_Error])
+    assert scheduler.stats()['queued'] == 0
+    with pytest.raises(RuntimeError):
+        scheduler.submit(*items[0])
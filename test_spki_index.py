@@ -0,0 +1,106 @@
+#
+# Certificate bundle scanning and the on-disk SPKI index
+#
+#       python -m pytest test_spki_index.py
+#
+
+import base64
+import hashlib
+
+import pytest
+
+import secp256r1
+
+def pem(certificates):
+    blocks = []
+    for certificate in certificates:
+        text = base64.encodebytes(certificate).replace(b'\n', b'')
+        lines = [text[i:i + 64] for i in range(0, len(text), 64)]
+        blocks.append(b'-----BEGIN CERTIFICATE-----\n' + b'\n'.join(lines) +
+                      b'\n-----END CERTIFICATE-----\n')
+    return b'subject=/CN=bundle\n' + b''.join(blocks)
+
+def build(tmp_path, bundle):
+    bundle_path = tmp_path / 'bundle'
+    bundle_path.write_bytes(bundle)
+    index_path = tmp_path / 'index'
+    count = secp256r1.ecdsa_build_spki_index(bundle_path, index_path)
+    return count, secp256r1.ecdsa_SPKIIndex(index_path)
+
+def digest(pki, label):
+    return hashlib.sha256(pki['spki'][label]).digest()
+
+def test_der_and_pem_bundles_agree(tmp_path, pki):
+    certificates = [pki['leaf'], pki['inter'], pki['root'], pki['fake_root']]
+    der = b''.join(certificates)
+    (tmp_path / 'der').write_bytes(der)
+    (tmp_path / 'pem').write_bytes(pem(certificates))
+    from_der = list(secp256r1.ecdsa_scan_certificate_bundle(tmp_path / 'der'))
+    from_pem = list(secp256r1.ecdsa_scan_certificate_bundle(tmp_path / 'pem'))
+    assert [key for _, _, key in from_der] == [key for _, _, key in from_pem]
+    assert [h for _, h, _ in from_der] == [
+            digest(pki, label) for label in ('leaf', 'inter', 'root', 'other')]
+    offsets = [0]
+    for certificate in certificates[:-1]:
+        offsets.append(offsets[-1] + len(certificate))
+    assert [offset for offset, _, _ in from_der] == offsets
+    text = pem(certificates)
+    assert [offset for offset, _, _ in from_pem] == [
+            i for i in range(len(text))
+            if text.startswith(b'-----BEGIN CERTIFICATE-----', i)]
+
+@pytest.mark.parametrize('form', ['der', 'pem'])
+def test_index(tmp_path, pki, form):
+    certificates = [pki['leaf'], pki['inter'], pki['root']]
+    bundle = b''.join(certificates) if form == 'der' else pem(certificates)
+    count, index = build(tmp_path, bundle)
+    with index:
+        assert count == len(index) == 3
+        for label in ('leaf', 'inter', 'root'):
+            offset, publickey = index.lookup(digest(pki, label))
+            assert index.lookup_spki(pki['spki'][label]) == (offset,
+                                                             publickey)
+            extract = (secp256r1.
+                       ecdsa_extract_publickey_octetstring_from_certificate)
+            assert extract(pki[label]) == publickey
+
+def test_duplicates_keep_the_first_offset(tmp_path, pki):
+    # leaf, v1_leaf and misnamed all carry the leaf key
+    certificates = [pki['inter'], pki['leaf'], pki['v1_leaf'],
+                    pki['misnamed'], pki['inter']]
+    count, index = build(tmp_path, b''.join(certificates))
+    with index:
+        assert count == len(index) == 2
+        assert index.lookup(digest(pki, 'inter'))[0] == 0
+        assert index.lookup(digest(pki, 'leaf'))[0] == len(pki['inter'])
+
+def test_lookup_miss(tmp_path, pki):
+    count, index = build(tmp_path, pki['leaf'])
+    with index:
+        assert index.lookup(digest(pki, 'other')) is None
+        assert index.lookup(bytes(32)) is None
+        assert index.lookup_spki(pki['spki']['root']) is None
+
+@pytest.mark.parametrize('bundle', [b'', b'\n\n', b'not a bundle\n'])
+def test_empty_bundle(tmp_path, pki, bundle):
+    count, index = build(tmp_path, bundle)
+    with index:
+        assert count == len(index) == 0
+        assert index.lookup(digest(pki, 'leaf')) is None
+
+def test_truncated_der_bundle(tmp_path, pki):
+    bundle = pki['leaf'] + pki['inter'][:-1]
+    with pytest.raises(secp256r1.ecdsa_Error):
+        build(tmp_path, bundle)
+
+def test_unterminated_pem_bundle(tmp_path, pki):
+    bundle = pem([pki['leaf']])
+    bundle = bundle[:bundle.index(b'-----END')]
+    with pytest.raises(secp256r1.ecdsa_Error):
+        build(tmp_path, bundle)
+
+def test_not_an_index(tmp_path):
+    path = tmp_path / 'index'
+    path.write_bytes(b'SPKIIDX0' + bytes(16))
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_SPKIIndex(path)
@@ -0,0 +1,110 @@
+#
+# Batch verification against ecdsa_verify_signature
+#
+#       python -m pytest test_verification.py
+#
+
+import pytest
+
+import secp256r1
+from secp256r1 import p, q
+
+def test_high_x_signature(high_x_item):
+    publickey, message, signature = high_x_item
+    r, _ = secp256r1._asn1_parse_a_sequence_of_two_signed_integers_(signature)
+    assert r + q < p
+    assert secp256r1._ecdsa_batch_R_(r) is None
+    assert secp256r1.ecdsa_verify_signature(publickey, message, signature)
+
+def test_batch_valid(items):
+    assert secp256r1.ecdsa_verify_signatures_batch(items) == (
+            (True,) * len(items))
+    assert secp256r1.ecdsa_verify_signatures_batch([]) == ()
+
+def test_batch_matches_single(mixed_items, single):
+    for item, expected in mixed_items:
+        assert single(*item) == expected
+    assert secp256r1.ecdsa_verify_signatures_batch(
+            item for item, _ in mixed_items) == tuple(
+            e for _, e in mixed_items)
+
+def test_batch_unparsable_raises_only_singly(items):
+    publickey, message, signature = items[0]
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_verify_signature(publickey, message, b'\x30\x00')
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_verify_signature(b'\x04' + bytes(64), message,
+                                         signature)
+
+@pytest.mark.parametrize('bad', [
+    (),
+    (0,),
+    (39,),
+    (5, 6),
+    (4, 5, 6, 7),
+    (1, 10, 17, 22, 23, 38),
+    tuple(range(0, 40, 3)),
+    tuple(range(40)),
+])
+@pytest.mark.parametrize('group_size', (4, 8))
+def test_batch_bisection_names_bad_indexes(items, single, bad, group_size,
+                                           monkeypatch):
+    monkeypatch.setattr(secp256r1, '_ecdsa_batch_group_size_', group_size)
+    items = tampered(items, bad)
+    expected = tuple(i not in bad for i in range(len(items)))
+    assert secp256r1.ecdsa_verify_signatures_batch(items) == expected
+    assert tuple(single(*item) for item in items) == expected
+
+@pytest.fixture
+def group_checks(monkeypatch):
+    # the indexes of every group whose batch equation is checked
+    calls = []
+    holds = secp256r1._ecdsa_batch_group_holds_
+    def spy(group):
+        calls.append(tuple(index for index, *_ in group))
+        return holds(group)
+    monkeypatch.setattr(secp256r1, '_ecdsa_batch_group_holds_', spy)
+    return calls
+
+def tampered(items, bad):
+    items = list(items)
+    for i in bad:
+        publickey, message, signature = items[i]
+        items[i] = (publickey, message + b'!', signature)
+    return items
+
+def test_batch_group_checks_valid(items, group_checks):
+    assert secp256r1.ecdsa_verify_signatures_batch(items[:16]) == (True,) * 16
+    assert group_checks == [(0, 1, 2, 3), (4, 5, 6, 7),
+                            (8, 9, 10, 11), (12, 13, 14, 15)]
+
+def test_batch_group_checks_failed_group(items, group_checks):
+    # a failed group of four is verified one by one, not bisected
+    results = secp256r1.ecdsa_verify_signatures_batch(
+            tampered(items[:8], (6,)))
+    assert results == (True,) * 6 + (False, True)
+    assert group_checks == [(0, 1, 2, 3), (4, 5, 6, 7)]
+
+def test_batch_group_checks_bisection(items, group_checks, monkeypatch):
+    # a failed group of eight is split into halves of four, and the
+    # failed half is verified one by one
+    monkeypatch.setattr(secp256r1, '_ecdsa_batch_group_size_', 8)
+    results = secp256r1.ecdsa_verify_signatures_batch(
+            tampered(items[:16], (6,)))
+    assert results == tuple(i != 6 for i in range(16))
+    assert group_checks == [tuple(range(8)), (0, 1, 2, 3), (4, 5, 6, 7),
+                            tuple(range(8, 16))]
+
+def test_batch_group_checks_mostly_invalid(items, group_checks):
+    # after two failed groups the rest is verified one by one
+    results = secp256r1.ecdsa_verify_signatures_batch(
+            tampered(items, range(len(items))))
+    assert results == (False,) * len(items)
+    assert group_checks == [(0, 1, 2, 3), (4, 5, 6, 7)]
+
+def test_batch_fallback_for_high_r(mixed_items, monkeypatch):
+    # every signature takes the path used when x(R) may be r + q
+    monkeypatch.setattr(secp256r1, '_ecdsa_batch_R_', lambda r: None)
+    assert secp256r1.ecdsa_verify_signatures_batch(
+            item for item, _ in mixed_items) == tuple(
+            e for _, e in mixed_items)
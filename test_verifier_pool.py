@@ -0,0 +1,59 @@
+#
+# The multi-process verifier pool and its shared memory segment
+#
+#       python -m pytest test_verifier_pool.py
+#
+
+import concurrent.futures
+import gc
+from multiprocessing import shared_memory
+
+import pytest
+
+import secp256r1
+
+def segment_exists(name):
+    try:
+        shared_memory.SharedMemory(name=name).close()
+    except FileNotFoundError:
+        return False
+    return True
+
+def test_results_match_verify_signature(mixed_items):
+    items = [item for item, _ in mixed_items]
+    with secp256r1.ecdsa_VerifierPool(workers=2, chunksize=4) as pool:
+        assert pool.verify(items) == tuple(e for _, e in mixed_items)
+        assert pool.verify([]) == ()
+
+def test_close_unlinks_the_segment():
+    pool = secp256r1.ecdsa_VerifierPool(workers=1)
+    name = pool._shm_.name
+    assert segment_exists(name)
+    pool.close()
+    assert not segment_exists(name)
+    pool.close()
+
+def test_unclosed_pool_unlinks_the_segment():
+    pool = secp256r1.ecdsa_VerifierPool(workers=1)
+    name = pool._shm_.name
+    pool._executor_.shutdown()
+    del pool
+    gc.collect()
+    assert not segment_exists(name)
+
+def test_failed_construction_unlinks_the_segment(monkeypatch):
+    created = []
+    class Recording(shared_memory.SharedMemory):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self.name)
+    class Failing:
+        def __init__(self, *args, **kwargs):
+            raise OSError('no processes')
+    monkeypatch.setattr(shared_memory, 'SharedMemory', Recording)
+    monkeypatch.setattr(concurrent.futures, 'ProcessPoolExecutor', Failing)
+    with pytest.raises(OSError):
+        secp256r1.ecdsa_VerifierPool(workers=1)
+    monkeypatch.undo()
+    assert len(created) == 1
+    assert not segment_exists(created[0])
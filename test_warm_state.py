@@ -0,0 +1,141 @@
+#
+# Saving and loading warm state snapshots
+#
+#       python -m pytest test_warm_state.py
+#
+
+import hashlib
+
+import pytest
+
+import secp256r1
+
+HEADER = secp256r1._ECDSA_WARM_STATE_HEADER_
+
+@pytest.fixture
+def snapshot(tmp_path, keys):
+    # a snapshot of the tables of the first two keys, unloaded afterwards
+    path = tmp_path / 'warm'
+    secp256r1.ecdsa_save_warm_state(path, [publickey for _, publickey
+                                           in keys[:2]])
+    try:
+        yield path
+    finally:
+        secp256r1.ecdsa_unload_warm_state()
+
+def rewrite(path, mutate, checksum=True):
+    data = bytearray(path.read_bytes())
+    mutate(data)
+    if checksum:
+        data[16:HEADER] = hashlib.sha256(data[HEADER:]).digest()
+    path.write_bytes(bytes(data))
+
+def fresh_publickey(publickey):
+    # an ecdsa_PublicKey that has not built its table yet, so that it
+    # takes it from a loaded snapshot; unparsable keys are left alone
+    try:
+        return secp256r1.ecdsa_PublicKey(publickey)
+    except secp256r1.ecdsa_Error:
+        return publickey
+
+def test_round_trip(snapshot, keys, mixed_items, single):
+    items = [item for item, _ in mixed_items]
+    without = [single(fresh_publickey(publickey), message, signature)
+               for publickey, message, signature in items]
+    secp256r1.ecdsa_load_warm_state(snapshot)
+    for _, publickey in keys[:2]:
+        point = fresh_publickey(publickey).point
+        assert secp256r1._ecdsa_warm_state_table_(point) is not None
+    assert secp256r1._ecdsa_warm_state_table_(
+            fresh_publickey(keys[2][1]).point) is None
+    assert [single(fresh_publickey(publickey), message, signature)
+            for publickey, message, signature in items] == without
+
+def test_round_trip_tables_match(snapshot, keys):
+    secp256r1.ecdsa_load_warm_state(snapshot)
+    for _, publickey in keys[:2]:
+        point = fresh_publickey(publickey).point
+        loaded = secp256r1._ecdsa_warm_state_table_(point)
+        built = secp256r1._ej_odd_multiples_table_(
+                secp256r1._ej_from_e_(point),
+                secp256r1._ECDSA_PUBLICKEY_WNAF_WIDTH_)
+        assert tuple(loaded) == tuple(built)
+
+def test_verify_with_snapshot(snapshot, items):
+    secp256r1.ecdsa_load_warm_state(snapshot)
+    for publickey, message, signature in items:
+        publickey = fresh_publickey(publickey)
+        assert secp256r1.ecdsa_verify_signature(publickey, message, signature)
+        assert not secp256r1.ecdsa_verify_signature(publickey, message + b'!',
+                                                    signature)
+
+def corrupt_checksum(data):
+    data[20] ^= 1
+
+def corrupt_body(data):
+    data[-1] ^= 1
+
+def corrupt_magic(data):
+    data[:8] = b'P256COLD'
+
+def corrupt_version(data):
+    data[8] = secp256r1._ECDSA_WARM_STATE_VERSION_ + 1
+
+def corrupt_width(data):
+    data[9] = 0
+
+def corrupt_count(data):
+    data[15] += 1
+
+@pytest.mark.parametrize('mutate, checksum', [
+    (corrupt_checksum, False),
+    (corrupt_body,     False),
+    (corrupt_magic,    True),
+    (corrupt_version,  True),
+    (corrupt_width,    True),
+    (corrupt_count,    True),
+])
+def test_corrupted(snapshot, mutate, checksum):
+    rewrite(snapshot, mutate, checksum)
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_load_warm_state(snapshot)
+    assert secp256r1._ecdsa_warm_state_ is None
+
+@pytest.mark.parametrize('length', [0, 7, HEADER - 1, HEADER, HEADER + 1,
+                                    -65, -1])
+def test_truncated(snapshot, length):
+    data = snapshot.read_bytes()
+    snapshot.write_bytes(data[:length])
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_load_warm_state(snapshot)
+
+def test_failed_load_keeps_the_loaded_snapshot(snapshot, tmp_path, keys):
+    secp256r1.ecdsa_load_warm_state(snapshot)
+    empty = tmp_path / 'empty'
+    empty.write_bytes(b'')
+    with pytest.raises(secp256r1.ecdsa_Error):
+        secp256r1.ecdsa_load_warm_state(empty)
+    assert secp256r1._ecdsa_warm_state_table_(
+            fresh_publickey(keys[0][1]).point) is not None
+
+def test_key_table_without_q_is_rebuilt(snapshot, keys, items):
+    # the first entry of a key table must be Q itself; a table whose
+    # first entry is G is ignored and the table rebuilt
+    publickey = keys[0][1]
+    G = secp256r1.e_to_octetstring(secp256r1.e(1))
+    def mutate(data):
+        offset = data.index(publickey) + 65
+        data[offset:offset + 64] = G[1:]
+    rewrite(snapshot, mutate)
+    secp256r1.ecdsa_load_warm_state(snapshot)
+    point = fresh_publickey(publickey).point
+    assert secp256r1._ecdsa_warm_state_table_(point) is None
+    assert secp256r1._ecdsa_warm_state_table_(
+            fresh_publickey(keys[1][1]).point) is not None
+    for item in items:
+        if item[0] == publickey:
+            _, message, signature = item
+            key = fresh_publickey(publickey)
+            assert secp256r1.ecdsa_verify_signature(key, message, signature)
+            assert not secp256r1.ecdsa_verify_signature(key, message + b'!',
+                                                        signature)